@@ -0,0 +1,59 @@
+'''
+Times the whole-board analysis of BoardArrays (blast coverage, Manhattan distance field, safe mask)
+on maps of growing size, with the pure Python versions and, when it is installed, with NumPy.
+The two are checked against each other.
+
+Usage: python benchmarks/bench_board_arrays.py [repeats]
+'''
+import sys, os, time, random
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from Grid import *
+from Topology import Topology
+from BoardArrays import *
+from bombmansim.Simulator import make_board, WALKABLE_CODES
+
+SIZES = [17, 51, 101, 201]
+
+def random_bombs(rng, grid, count):
+	bombs = {}
+	while len(bombs) < count:
+		x = rng.randrange(1, grid.width - 1)
+		y = rng.randrange(1, grid.height - 1)
+		if grid.get(x, y) == BLANK:
+			bombs[(x, y)] = {'owner': 0, 'range': rng.randrange(0, 6), 'time_left': rng.randrange(1, 16)}
+			grid.set(x, y, BOMB)
+	return bombs
+
+def timed(repeats, function, *args):
+	start = time.time()
+	for i in range(repeats):
+		result = function(*args)
+	return (result, (time.time() - start) * 1000.0 / repeats)
+
+def main(repeats):
+	rng = random.Random(1)
+	implementations = [('python', python_blast_coverage, python_manhattan_field, python_safe_mask)]
+	if HAVE_NUMPY:
+		implementations.append(('numpy', numpy_blast_coverage, numpy_manhattan_field, numpy_safe_mask))
+	else:
+		print("NumPy is not installed, only timing the Python versions")
+	failures = 0
+	for size in SIZES:
+		grid = Grid.from_list(make_board(size, size, 0.4, rng))
+		topology = Topology(grid)
+		bombs = random_bombs(rng, grid, size * size // 40)
+		results = []
+		for (name, coverage, manhattan, safe) in implementations:
+			(c, coverage_ms) = timed(repeats, coverage, grid, bombs, topology)
+			(m, manhattan_ms) = timed(repeats, manhattan, grid, (size // 2, size // 2))
+			(s, safe_ms) = timed(repeats, safe, grid, bombs, WALKABLE_CODES, topology)
+			results.append([[int(v) for v in r] for r in (c, m, s)])
+			print("{0:>3}x{0:<3} {1:>6}: coverage {2:8.3f} ms, manhattan {3:8.3f} ms, safe mask {4:8.3f} ms".format(size, name, coverage_ms, manhattan_ms, safe_ms))
+		if len(results) > 1 and results[0] != results[1]:
+			failures += 1
+			print("{0}x{0}: numpy and python disagree".format(size))
+	return failures
+
+if __name__ == '__main__':
+	sys.exit(1 if main(int(sys.argv[1]) if len(sys.argv) > 1 else 10) else 0)
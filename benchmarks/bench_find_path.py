@@ -0,0 +1,110 @@
+'''
+Compares the heap based PathFinder with the sorted open list A* find_path used to have.
+Both are run on the same queries over generated boards; path lengths must agree.
+
+Usage: python benchmarks/bench_find_path.py [queries]
+'''
+import sys, os, time, random
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from boards import make_board
+from Grid import Grid
+from Direction import *
+from Pathing import PathFinder
+from bombmanplayer.PlayerAI import SAFE_WALKABLE_CODES, manhattan_distance
+
+class LegacyFindPath():
+	'''
+	The find_path PlayerAI used to have, with an expansion counter added.
+	'''
+	def __init__(self):
+		self.expansions = 0
+
+	def find_path(self, start, end, map_list):
+		initialobj = {'node': start, 'open': True, 'closed': False, 'parent': None, 'g': 0, 'h': manhattan_distance(start, end), 'f': manhattan_distance(start, end)}
+		bopen = [initialobj]
+		bvisited = {initialobj['node']: initialobj}
+		while len(bopen) > 0:
+			bopen.sort(key=lambda a: a['f'])
+			best = bopen.pop(0)
+			self.expansions += 1
+			best['open'] = False
+			if best['node'] == end:
+				path = []
+				curvisited = best
+				while curvisited != None and curvisited['node'] != start:
+					path.append(curvisited['node'])
+					curvisited = curvisited['parent']
+				return path
+			for direction in Directions.values():
+				if direction == STILL:
+					continue
+				x = best['node'][0] + direction.dx
+				y = best['node'][1] + direction.dy
+				if not SAFE_WALKABLE_CODES[map_list.get(x, y)]:
+					continue
+				newnode = (x, y)
+				dist = manhattan_distance(best['node'], newnode)
+				nodeobj = None
+				try:
+					nodeobj = bvisited[newnode]
+				except KeyError:
+					nodeobj = {'node': newnode, 'open': False, 'closed': False, 'parent': best, 'g': 999999, 'h': 999999, 'f': 999999}
+					bvisited[newnode] = nodeobj
+				new_g = best['g'] + dist
+				if new_g < nodeobj['g']:
+					if not nodeobj['open']:
+						nodeobj['open'] = True
+						bopen.append(nodeobj)
+					nodeobj['g'] = new_g
+					nodeobj['h'] = manhattan_distance(newnode, end)
+					nodeobj['f'] = new_g + nodeobj['h']
+					nodeobj['parent'] = best
+		return None
+
+def queries(rng, count):
+	'''
+	Returns a list of (grid, start, end) over a handful of boards of different sizes and densities.
+	'''
+	result = []
+	boards = []
+	for size in [11, 17, 17, 31]:
+		for density in [0.0, 0.3, 0.6]:
+			grid = Grid.from_list(make_board(size, size, density, rng))
+			open_cells = [(x, y) for x in range(size) for y in range(size) if SAFE_WALKABLE_CODES[grid.get(x, y)]]
+			boards.append((grid, open_cells))
+	for i in range(count):
+		(grid, open_cells) = rng.choice(boards)
+		result.append((grid, rng.choice(open_cells), rng.choice(open_cells)))
+	return result
+
+def main(count):
+	work = queries(random.Random(1), count)
+	finders = {}
+	for (grid, start, end) in work:
+		if id(grid) not in finders:
+			finders[id(grid)] = PathFinder(grid, SAFE_WALKABLE_CODES)
+
+	legacy = LegacyFindPath()
+	results = {}
+	for name in ['legacy', 'heap']:
+		lengths = []
+		start_time = time.time()
+		for (grid, start, end) in work:
+			if name == 'legacy':
+				path = legacy.find_path(start, end, grid)
+			else:
+				path = finders[id(grid)].find_path(start, end, grid)
+			lengths.append(None if path is None else len(path))
+		elapsed = time.time() - start_time
+		expansions = legacy.expansions if name == 'legacy' else sum(f.expansions for f in finders.values())
+		results[name] = lengths
+		print("{0:>7}: {1:8.1f} queries/s {2:10.0f} expansions/s ({3} expansions)".format(name, len(work) / elapsed, expansions / elapsed, expansions))
+	if results['legacy'] != results['heap']:
+		print("path lengths differ!")
+		return 1
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
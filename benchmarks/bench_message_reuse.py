@@ -0,0 +1,124 @@
+'''
+Parses the same turns through the client's ParseFromString path with a new BomberManMessage
+every turn and with one message in reuse mode, and reports per 1000 turns the protobuf objects
+allocated, the collections the cyclic garbage collector ran and the time it spent.
+
+Collection pauses are measured as the time the turns take with the collector enabled minus the
+time they take with it disabled (the best of a few alternating runs each), as Python 2 has no
+gc.callbacks; expect a fair amount of noise in it.
+
+Usage: python benchmarks/bench_message_reuse.py [turns] [repeats]
+'''
+import sys, os, gc, time, random, weakref
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from boards import random_message
+from google.protobuf.internal import containers
+from bombmanclient import BomberManProtocol_pb2
+from bombmanclient.BomberManProtocol_pb2 import MOVE_DOWN
+from bombmanclient.Client import BombmanClient
+
+class AllocationCounter(object):
+	'''
+	Counts the protobuf messages and repeated field containers constructed while installed.
+	'''
+	def __init__(self):
+		self.count = 0
+		self.classes = [containers.RepeatedCompositeFieldContainer, containers.RepeatedScalarFieldContainer]
+		descriptors = list(BomberManProtocol_pb2.DESCRIPTOR.message_types_by_name.values())
+		while descriptors:
+			descriptor = descriptors.pop()
+			self.classes.append(descriptor._concrete_class)
+			descriptors.extend(descriptor.nested_types)
+		self.originals = None
+
+	def install(self):
+		self.originals = [cls.__dict__['__init__'] for cls in self.classes]
+		for (cls, original) in zip(self.classes, self.originals):
+			cls.__init__ = self.counting(original)
+
+	def counting(self, original):
+		def init(instance, *args, **kwargs):
+			self.count += 1
+			original(instance, *args, **kwargs)
+		return init
+
+	def uninstall(self):
+		for (cls, original) in zip(self.classes, self.originals):
+			cls.__init__ = original
+
+class CollectionCounter(object):
+	'''
+	Counts the collections the garbage collector runs: a young piece of cyclic garbage is only
+	freed by a collection, and its weakref callback arms a new one.
+	'''
+	def __init__(self):
+		self.count = 0
+		self.armed = None
+
+	def arm(self):
+		sentinel = _Cycle()
+		sentinel.cycle = sentinel
+		self.armed = weakref.ref(sentinel, self.collected)
+
+	def collected(self, ref):
+		self.count += 1
+		self.arm()
+
+class _Cycle(object):
+	pass
+
+def play(client, payloads):
+	'''
+	Runs every payload through parsing, building every field of the view, and the response.
+	'''
+	for data in payloads:
+		view = client.parse_message(data).materialize()
+		client.responses.serialize(view.playerID, view.playerNum, MOVE_DOWN, view.responseID)
+
+def timed(client, payloads, repeats):
+	'''
+	Returns the best times (with the collector, without it) of repeats runs, alternating the two.
+	'''
+	best = [None, None]
+	for i in range(repeats):
+		for collect in [True, False]:
+			gc.collect()
+			if not collect:
+				gc.disable()
+			start = time.time()
+			play(client, payloads)
+			seconds = time.time() - start
+			gc.enable()
+			if best[collect] is None or seconds < best[collect]:
+				best[collect] = seconds
+	return (best[True], best[False])
+
+def main(turns, repeats):
+	rng = random.Random(1)
+	payloads = [random_message(rng).SerializeToString() for i in range(turns)]
+	per = 1000.0 / turns
+	for reuse in [False, True]:
+		client = BombmanClient(fast_decode=False, reuse_messages=reuse)
+		# warm up, so a reused message holds its containers before counting
+		play(client, payloads[:10])
+
+		allocations = AllocationCounter()
+		allocations.install()
+		play(client, payloads)
+		allocations.uninstall()
+
+		gc.collect()
+		collections = CollectionCounter()
+		collections.arm()
+		play(client, payloads)
+		collections.armed = None
+
+		(with_gc, without_gc) = timed(client, payloads, repeats)
+		# without any collection the difference is only noise
+		collecting = max(with_gc - without_gc, 0.0) if collections.count else 0.0
+		print("{0:>8}: {1:.0f} protobuf objects allocated, {2:.0f} collections, {3:.1f} ms collecting, {4:.1f} ms in total per 1000 turns".format(
+			'reuse' if reuse else 'no reuse', allocations.count * per, collections.count * per, collecting * 1000 * per, with_gc * 1000 * per))
+
+if __name__ == '__main__':
+	main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000, int(sys.argv[2]) if len(sys.argv) > 2 else 5)
@@ -0,0 +1,53 @@
+'''
+Counts the move sequences reachable from the start of a game at growing depths with the
+Bitboard move generator, perft style, and reports states generated per second.
+
+Before that, random games are played both on the Bitboard and in the simulator to check
+that they agree.
+
+Usage: python benchmarks/bench_perft.py [depth] [seed]
+'''
+import sys, os, time, random
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from Bitboard import *
+from bombmansim.Simulator import Game
+
+def check(games, seed):
+	'''
+	Plays games random games in the simulator and on the Bitboard side by side.
+	Returns the number of turns on which they disagreed.
+	'''
+	rng = random.Random(seed)
+	mismatches = 0
+	for number in range(games):
+		game = Game(seed=seed + number, powerup_chance=0.0, max_turns=200)
+		board = Bitboard(game.grid)
+		state = board.state(game.grid, game.bombs, game.bombers)
+		while not game.finished():
+			moves = [rng.choice(board.actions(state, player)) for player in range(2)]
+			game.step([move[0] for move in moves])
+			state = board.successor(state, moves)
+			expected = board.state(game.grid, game.bombs, game.bombers)
+			expected = BitState(expected.blocks, expected.bombs, expected.bombers, tuple(game.alive))
+			if state != expected:
+				mismatches += 1
+				state = expected
+	return mismatches
+
+def main(depth, seed):
+	mismatches = check(20, seed)
+	print("simulator cross-check: {0} mismatched turns".format(mismatches))
+
+	game = Game(seed=seed)
+	board = Bitboard(game.grid)
+	state = board.state(game.grid, game.bombs, game.bombers)
+	for d in range(1, depth + 1):
+		start = time.time()
+		nodes = board.perft(state, d)
+		elapsed = time.time() - start
+		print("depth {0}: {1} leaves, {2:.2f} s, {3:.0f} leaves/s".format(d, nodes, elapsed, nodes / elapsed if elapsed > 0 else 0))
+	return mismatches
+
+if __name__ == '__main__':
+	sys.exit(1 if main(int(sys.argv[1]) if len(sys.argv) > 1 else 3, int(sys.argv[2]) if len(sys.argv) > 2 else 1) else 0)
@@ -0,0 +1,70 @@
+'''
+Replays recorded frames through the client's decode + get_move pipeline and
+reports turns per second, without a server.
+
+Usage: python benchmarks/bench_replay.py [replay file] [repeats]
+Without a replay file, one is recorded from simulated games first.
+'''
+import sys, os, time, tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bombmanclient.BomberManProtocol_pb2 import *
+from bombmanclient.Client import BombmanClient
+from bombmanclient.Replay import ReplayRecorder, ReplayReader
+from bombmansim.Simulator import Game
+from bombmansim.Messages import make_message
+from bombmanplayer.PlayerAI import PlayerAI
+
+def record_simulated(path, games=5, compress=True):
+	'''
+	Records the frames player 0 would have received in a few simulated games.
+	'''
+	recorder = ReplayRecorder(path, compress)
+	for seed in range(games):
+		game = Game(seed=seed, max_turns=300)
+		ais = [PlayerAI(), PlayerAI()]
+		for index in range(2):
+			view = game.view(index)
+			ais[index].new_game(view[0], game.blocks(), view[3], index)
+		recorder.record(make_message(game.grid.to_list(), START_GAME, game.bombs, game.powerups, game.bombers, game.explosions, 0, game.turn).SerializeToString())
+		while not game.finished():
+			recorder.record(make_message(game.grid.to_list(), MOVE_REQUEST, game.bombs, game.powerups, game.bombers, game.explosions, 0, game.turn).SerializeToString())
+			game.step([ais[index].get_move(*game.view(index)) for index in range(2)])
+		recorder.record(make_message(game.grid.to_list(), END_GAME, game.bombs, game.powerups, game.bombers, game.explosions, 0, game.turn).SerializeToString())
+	recorder.close()
+
+def replay(path, fast_decode):
+	'''
+	Returns (turns, seconds) to push every frame of the replay through decoding and the AI.
+	'''
+	client = BombmanClient(fast_decode=fast_decode)
+	ai = PlayerAI()
+	client.ai = ai
+	turns = 0
+	start = time.time()
+	for frame in ReplayReader(path):
+		msg = client.decode_message(frame)
+		if msg.messageType == START_GAME:
+			ai.new_game(msg.map_list, msg.blocks, msg.bombers, msg.playerNum)
+		elif msg.messageType == MOVE_REQUEST:
+			client.compute_move(msg, None)
+			turns += 1
+	return (turns, time.time() - start)
+
+def main(path, repeats):
+	if path is None:
+		path = os.path.join(tempfile.mkdtemp(), 'simulated.replay')
+		record_simulated(path)
+		print("recorded simulated games to {0} ({1} bytes)".format(path, os.path.getsize(path)))
+	for fast_decode in [False, True]:
+		turns = 0
+		seconds = 0.0
+		for i in range(repeats):
+			(t, s) = replay(path, fast_decode)
+			turns += t
+			seconds += s
+		print("{0:>15}: {1} turns, {2:.1f} turns/s".format('FastDecoder' if fast_decode else 'ParseFromString', turns, turns / seconds))
+
+if __name__ == '__main__':
+	main(sys.argv[1] if len(sys.argv) > 1 else None, int(sys.argv[2]) if len(sys.argv) > 2 else 1)
@@ -0,0 +1,94 @@
+'''
+Feeds frames over a socketpair and compares the old string-accumulating
+read path with SocketChannel's recv_into path.
+
+Frames are sent whole, and then in pieces of CHUNK bytes through a small
+socket buffer, the way a large frame arrives over TCP. Whole frames are
+read with a single recv, so both paths read at about the same speed. In
+pieces, the old path concatenates strings once per piece, which could
+grow with the square of the frame size, while recv_into fills the buffer
+in place. CPython usually resizes the string in place for buf += data,
+though, and the recv calls dominate at these sizes, so expect the two to
+stay close here as well.
+Only reads are timed: on Python 2 sockets have no sendmsg, so writes are
+joined and sent with sendall by both.
+
+Usage: python benchmarks/bench_socketchannel.py [frames per size]
+'''
+import sys, os, time, socket, struct, threading, random
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from boards import make_board, make_message
+from bombmanclient.SocketChannel import SocketChannel
+
+class LegacyChannel(SocketChannel):
+	'''
+	The read path SocketChannel used to have, kept as the baseline.
+	'''
+	def read(self):
+		lenField = self.legacy_readnbytes(4)
+		length = struct.unpack('>L', lenField)[0]
+		return self.legacy_readnbytes(length)
+
+	def legacy_readnbytes(self, n):
+		buf = ''
+		while n > 0:
+			data = self.sock.recv(n)
+			if data == '':
+				raise Exception("socket broken or connection closed")
+			buf += data
+			n -= len(data)
+		return buf
+
+# size of the pieces frames are sent in, and of the socket buffer they go through
+CHUNK = 1024
+
+def send_frames(sock, payload, count):
+	frame = struct.pack('>L', len(payload)) + payload
+	for i in range(count):
+		sock.sendall(frame)
+
+def send_chunked(sock, payload, count):
+	frame = struct.pack('>L', len(payload)) + payload
+	for i in range(count):
+		for start in range(0, len(frame), CHUNK):
+			sock.sendall(frame[start:start + CHUNK])
+
+def run(reader, payload, count, send):
+	'''
+	Returns (MB/s, mean microseconds per frame) for reading count frames of payload, sent by
+	send, the way the client does, through read_frame when the channel has it.
+	'''
+	ours, theirs = socket.socketpair()
+	if send is send_chunked:
+		theirs.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, CHUNK)
+		ours.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, CHUNK)
+	sender = threading.Thread(target=send, args=(theirs, payload, count))
+	sender.daemon = True
+	channel = reader(ours)
+	read = channel.read if reader is LegacyChannel else channel.read_frame
+	sender.start()
+	start = time.time()
+	for i in range(count):
+		read()
+	elapsed = time.time() - start
+	sender.join()
+	ours.close()
+	theirs.close()
+	return (len(payload) * count / elapsed / 1e6, elapsed * 1e6 / count)
+
+def main(count):
+	rng = random.Random(1)
+	if not hasattr(socket.socket, 'sendmsg'):
+		print("no socket.sendmsg: flush joins frames and uses sendall, writes are not compared")
+	for size in [11, 17, 31, 51]:
+		payload = make_message(make_board(size, size, 0.5, rng)).SerializeToString()
+		print("{0}x{0} map, {1} byte frames".format(size, len(payload)))
+		for (how, send) in [('whole', send_frames), ('in pieces', send_chunked)]:
+			for name, reader in [('before', LegacyChannel), ('after', SocketChannel)]:
+				mbps, latency = run(reader, payload, count, send)
+				print("  {0:>9} {1:>6}: {2:8.1f} MB/s {3:8.1f} us/frame".format(how, name, mbps, latency))
+	print("differences within a few percent are noise, not a speedup")
+
+if __name__ == '__main__':
+	main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
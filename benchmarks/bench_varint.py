@@ -0,0 +1,112 @@
+'''
+Times varint decoding over BomberManMessage payloads: the byte at a time loop decoder.py used to
+have against the current one-and-two-byte fast path, and per value decoding against the bulk
+packed run decoder. Reports varints per second; the decoded values must agree.
+
+Usage: python benchmarks/bench_varint.py [replay file] [repeats]
+Without a replay file, generated messages are used.
+'''
+import sys, os, time, random
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from boards import random_message
+from google.protobuf.internal import decoder
+from bombmanclient.BomberManProtocol_pb2 import BomberManMessage
+from bombmanclient.Replay import ReplayReader
+
+def legacy_decode_varint(buffer, pos, mask=(1 << 64) - 1):
+	'''
+	The generic loop _VarintDecoder used to return.
+	'''
+	result = 0
+	shift = 0
+	while 1:
+		b = ord(buffer[pos])
+		result |= ((b & 0x7f) << shift)
+		pos += 1
+		if not (b & 0x80):
+			result &= mask
+			return (result, pos)
+		shift += 7
+
+def varint_positions(buf, pos, end, descriptor, positions):
+	'''
+	Appends the position of every varint in the message (tags, lengths and values) to positions.
+	'''
+	while pos < end:
+		positions.append(pos)
+		(tag, pos) = decoder._DecodeVarint(buf, pos)
+		wire_type = tag & 7
+		if wire_type == 0:
+			positions.append(pos)
+			(value, pos) = decoder._DecodeVarint(buf, pos)
+		elif wire_type == 2:
+			positions.append(pos)
+			(size, pos) = decoder._DecodeVarint(buf, pos)
+			field = descriptor.fields_by_number.get(tag >> 3)
+			if field is not None and field.message_type is not None:
+				varint_positions(buf, pos, pos + size, field.message_type, positions)
+			pos += size
+		else:
+			raise ValueError('unexpected wire type {0}'.format(wire_type))
+
+def payloads(path):
+	if path is not None:
+		return [bytes(frame) for frame in ReplayReader(path)]
+	rng = random.Random(1)
+	return [random_message(rng).SerializeToString() for i in range(50)]
+
+def rate(count, seconds):
+	return count / seconds if seconds > 0 else 0
+
+def main(path, repeats):
+	messages = [(data, []) for data in payloads(path)]
+	for (data, positions) in messages:
+		varint_positions(data, 0, len(data), BomberManMessage.DESCRIPTOR, positions)
+	count = sum(len(positions) for (data, positions) in messages) * repeats
+
+	results = {}
+	for (name, decode) in [('legacy loop', legacy_decode_varint), ('fast path', decoder._DecodeVarint)]:
+		values = []
+		start = time.time()
+		for i in range(repeats):
+			values = []
+			for (data, positions) in messages:
+				for pos in positions:
+					values.append(decode(data, pos)[0])
+		elapsed = time.time() - start
+		results[name] = values
+		print("{0:>16}: {1} varints, {2:.0f} varints/s".format(name, count, rate(count, elapsed)))
+	sizes = {}
+	for value in results['fast path']:
+		length = 1 if value < 0x80 else 2 if value < 0x4000 else 3
+		sizes[length] = sizes.get(length, 0) + 1
+	print("{0:>16}: {1}".format('bytes per varint', ', '.join('{0}: {1}'.format(k, sizes[k]) for k in sorted(sizes))))
+
+	# the same values back to back, as in the payload of a packed field
+	run = ''.join(decoder.encoder._VarintBytes(value) for value in results['fast path'])
+	for (name, decode_run) in [('per value', None), ('packed run', decoder._DecodeVarintRun)]:
+		start = time.time()
+		for i in range(repeats):
+			if decode_run is None:
+				values = []
+				pos = 0
+				end = len(run)
+				while pos < end:
+					(value, pos) = decoder._DecodeVarint(run, pos)
+					values.append(value)
+			else:
+				(values, pos) = decode_run(run, 0, len(run))
+		elapsed = time.time() - start
+		results[name] = values
+		print("{0:>16}: {1} varints, {2:.0f} varints/s".format(name, count, rate(count, elapsed)))
+
+	failures = 0
+	for name in ['legacy loop', 'per value', 'packed run']:
+		if results[name] != results['fast path']:
+			failures += 1
+			print("{0} disagrees with the fast path".format(name))
+	return failures
+
+if __name__ == '__main__':
+	sys.exit(1 if main(sys.argv[1] if len(sys.argv) > 1 else None, int(sys.argv[2]) if len(sys.argv) > 2 else 5) else 0)
@@ -0,0 +1,33 @@
+'''
+Helpers that generate realistic boards and BomberManMessages for the benchmarks.
+'''
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+import random
+
+from bombmanclient.BomberManProtocol_pb2 import *
+from Enums import *
+from bombmansim.Simulator import make_board
+from bombmansim.Messages import make_message
+
+def random_message(rng=random, width=17, height=17):
+	'''
+	Returns a mid-game looking BomberManMessage with a few bombs, powerups and explosions.
+	'''
+	board = make_board(width, height, rng.uniform(0.2, 0.7), rng)
+	blanks = [(x, y) for x in range(width) for y in range(height) if board[x][y] == Enums.MapItems.BLANK]
+	rng.shuffle(blanks)
+	bombs = {}
+	for pos in blanks[:rng.randint(0, 4)]:
+		bombs[pos] = {'owner': rng.randint(0, 1), 'range': rng.randint(1, 4), 'time_left': rng.randint(1, 16)}
+		board[pos[0]][pos[1]] = Enums.MapItems.BOMB
+	powerups = {}
+	for pos in blanks[4:4 + rng.randint(0, 3)]:
+		powerups[pos] = rng.choice([Enums.PowerUps.FIREUP, Enums.PowerUps.BOMBUP])
+		board[pos[0]][pos[1]] = Enums.MapItems.POWERUP
+	explosions = []
+	for pos in blanks[8:8 + rng.choice([0, 0, 3, 7])]:
+		explosions.append(pos)
+		board[pos[0]][pos[1]] = Enums.MapItems.EXPLOSION
+	return make_message(board, bombs=bombs, powerups=powerups, explosions=explosions, response_id=rng.randint(0, 500))
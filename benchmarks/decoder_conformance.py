@@ -0,0 +1,196 @@
+'''
+Checks that FastDecoder produces exactly what the reflective ParseFromString
+path produces, then compares their speed.
+
+ParseFromString parses the elements of repeated fields lazily, so it defers
+their parse errors until they are read; IsInitialized must report them
+rather than raise.
+
+Besides well-formed messages, malformed and unusual ones (truncated frames,
+unknown fields of every wire type, repeated singular sub-messages, unknown
+map items) are checked: FastDecoder must raise DecodeError or agree with
+ParseFromString, and the client's decode_message, which falls back to
+ParseFromString, must agree with it or reject the message as well.
+
+Usage: python benchmarks/decoder_conformance.py [replay file | number of messages]
+Without a replay file, that many generated messages are used (200 by default).
+'''
+import sys, os, time, random
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from boards import random_message
+from google.protobuf.internal import encoder
+from google.protobuf.message import DecodeError
+from bombmanclient.BomberManProtocol_pb2 import BomberManMessage, BombMessage, MapEntry, Position
+from bombmanclient.Client import BombmanClient
+from bombmanclient.FastDecoder import decode_message
+from bombmanclient.Replay import ReplayReader
+
+FIELDS = ['messageType', 'playerNum', 'playerID', 'responseID', 'map_list', 'blocks', 'bombs', 'powerups', 'bombers', 'explosions']
+
+def compare(client, data):
+	'''
+	Returns the list of fields on which the two decoders disagree.
+	'''
+	fast = decode_message(data)
+	reference = client.parse_message(data)
+	return [field for field in FIELDS if getattr(fast, field) != getattr(reference, field)]
+
+# a field number BomberManMessage and its sub-messages do not use
+UNKNOWN_FIELD = 15
+
+def field(number, wire_type, payload=''):
+	# built by hand, TagBytes refuses the invalid wire types
+	return encoder._VarintBytes((number << 3) | wire_type) + payload
+
+def sub_message(number, body):
+	return field(number, 2, encoder._VarintBytes(len(body)) + body)
+
+def position(x, y):
+	return Position(x=x, y=y).SerializeToString()
+
+def edge_cases(data):
+	'''
+	Returns a list of (name, serialized message) built from the well-formed message data.
+	'''
+	cases = []
+	for cut in sorted(set([1, len(data) // 3, len(data) // 2, len(data) - 1])):
+		cases.append(('truncated to {0} bytes'.format(cut), data[:cut]))
+	cases.append(('unknown varint field', data + field(UNKNOWN_FIELD, 0, encoder._VarintBytes(300))))
+	cases.append(('unknown fixed64 field', data + field(UNKNOWN_FIELD, 1, '\x01' * 8)))
+	cases.append(('unknown fixed32 field', data + field(UNKNOWN_FIELD, 5, '\x01' * 4)))
+	cases.append(('unknown length-delimited field', data + sub_message(UNKNOWN_FIELD, 'abc')))
+	cases.append(('unknown group', data + field(UNKNOWN_FIELD, 3) + field(UNKNOWN_FIELD, 4)))
+	cases.append(('invalid wire type 6', data + field(UNKNOWN_FIELD, 6)))
+	cases.append(('invalid wire type 7', data + field(UNKNOWN_FIELD, 7)))
+	cases.append(('repeated mapSize', data + sub_message(6, position(17, 17))))
+	bomb = BombMessage(range=2, timeLeft=5, owner=1)
+	bomb.pos.x = 3
+	bomb.pos.y = 3
+	cases.append(('truncated bomb', data + sub_message(8, sub_message(1, position(5, 5))[:-1])))
+	cases.append(('bomb without an owner', data + sub_message(8, sub_message(1, position(5, 5)))))
+	cases.append(('repeated bomb position', data + sub_message(8, bomb.SerializeToString() + sub_message(1, position(5, 5)))))
+	entry = MapEntry(mapItem='NOT_AN_ITEM')
+	entry.pos.x = 1
+	entry.pos.y = 1
+	cases.append(('unknown map item', data + sub_message(7, entry.SerializeToString())))
+	entry = MapEntry(mapItem='BLANK')
+	entry.pos.x = 1
+	entry.pos.y = 1
+	cases.append(('group in a map entry', data + sub_message(7, entry.SerializeToString() + field(UNKNOWN_FIELD, 3) + field(UNKNOWN_FIELD, 4))))
+	return cases
+
+def fields(decode, data):
+	'''
+	Returns the list of values of FIELDS decode(data) gives, or the exception it raised.
+	'''
+	try:
+		view = decode(data)
+		return [getattr(view, name) for name in FIELDS]
+	except Exception, e:
+		return e
+
+def check_edge_case(client, data):
+	'''
+	Returns a description of what went wrong with data, or None.
+	'''
+	reference = fields(client.parse_message, data)
+	fast = fields(decode_message, data)
+	if isinstance(fast, Exception):
+		if not isinstance(fast, DecodeError):
+			return "FastDecoder raised {0!r} instead of DecodeError".format(fast)
+	elif isinstance(reference, Exception):
+		return "FastDecoder accepted a message ParseFromString rejects with {0!r}".format(reference)
+	elif fast != reference:
+		return "FastDecoder disagrees with ParseFromString"
+	fallback = fields(client.decode_message, data)
+	if isinstance(reference, Exception):
+		if not isinstance(fallback, Exception):
+			return "decode_message accepted a message ParseFromString rejects with {0!r}".format(reference)
+	elif isinstance(fallback, Exception):
+		return "decode_message raised {0!r} on a message ParseFromString accepts".format(fallback)
+	elif fallback != reference:
+		return "decode_message disagrees with ParseFromString"
+	return None
+
+def check_lazy_merge(data):
+	'''
+	Merges data twice with an element added in between, which mixes lazily parsed elements of
+	repeated fields with ones added directly. Returns True if every element comes out in order.
+	'''
+	once = BomberManMessage()
+	once.MergeFromString(data)
+	expected = [(e.x, e.y) for e in once.explosions] + [(99, 99)] + [(e.x, e.y) for e in once.explosions]
+	merged = BomberManMessage()
+	merged.MergeFromString(data)
+	added = merged.explosions.add()
+	added.x = 99
+	added.y = 99
+	merged.MergeFromString(data)
+	return len(merged.explosions) == len(expected) and [(e.x, e.y) for e in merged.explosions] == expected
+
+def check_deferred_errors(data):
+	'''
+	Parses data with a truncated bomb appended, which the lazy parsing of repeated fields only
+	notices when the bomb is read. Returns True if IsInitialized reports it instead of raising.
+	'''
+	message = BomberManMessage()
+	message.ParseFromString(data + sub_message(8, sub_message(1, position(5, 5))[:-1]))
+	errors = []
+	try:
+		return not message.IsInitialized(errors) and len(errors) == 1
+	except DecodeError:
+		return False
+
+def load_payloads(argument):
+	'''
+	Returns the frames of the replay file named by argument, or that many generated messages.
+	'''
+	if argument is not None and not argument.isdigit():
+		return [bytes(frame) for frame in ReplayReader(argument)]
+	rng = random.Random(1)
+	return [random_message(rng).SerializeToString() for i in range(int(argument or 200))]
+
+def main(argument):
+	client = BombmanClient()
+	payloads = load_payloads(argument)
+
+	failures = 0
+	for data in payloads:
+		mismatched = compare(client, data)
+		if mismatched:
+			failures += 1
+			print("mismatch on fields {0}".format(', '.join(mismatched)))
+	print("{0} messages, {1} mismatches".format(len(payloads), failures))
+
+	edge_failures = 0
+	edge_count = 0
+	for data in payloads[:10]:
+		for (name, case) in edge_cases(data):
+			edge_count += 1
+			problem = check_edge_case(client, case)
+			if problem:
+				edge_failures += 1
+				print("{0}: {1}".format(name, problem))
+	print("{0} edge cases, {1} failures".format(edge_count, edge_failures))
+	failures += edge_failures
+
+	lazy_failures = len([data for data in payloads if not check_lazy_merge(data)])
+	print("merge, add, merge: {0} failures".format(lazy_failures))
+	failures += lazy_failures
+
+	deferred_failures = len([data for data in payloads if not check_deferred_errors(data)])
+	print("deferred parse errors: {0} failures".format(deferred_failures))
+	failures += deferred_failures
+
+	# fields are built lazily, so build them all to time the complete conversion
+	for name, decode in [('ParseFromString', lambda data: client.parse_message(data).materialize()), ('FastDecoder', decode_message)]:
+		start = time.time()
+		for data in payloads:
+			decode(data)
+		elapsed = time.time() - start
+		print("{0:>16}: {1:.3f} ms per message".format(name, elapsed * 1000.0 / len(payloads)))
+	return failures
+
+if __name__ == '__main__':
+	sys.exit(1 if main(sys.argv[1] if len(sys.argv) > 1 else None) else 0)
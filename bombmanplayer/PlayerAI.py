@@ -4,25 +4,39 @@ import random
 from bombmanclient.Client import *
 from Enums import *
 from Direction import *
+from Grid import *
+from Pathing import *
+from DangerMap import *
+from BoardArrays import safe_mask
+from Topology import Topology
+from CellSet import CellSet
 
 import sys
 
 # Walkable array with explosions trimmed out, because one does not simply walk into explosions
 SAFE_WALKABLE = [Enums.MapItems.BLANK, Enums.MapItems.POWERUP]
+# the same set as tile codes, index it with Grid.get
+SAFE_WALKABLE_CODES = code_table([BLANK, POWERUP])
+# actions which place a bomb
+BOMB_ACTIONS = [d.bombaction for d in Directions.values()]
 
 class PlayerAI():
 
 	def __init__(self):
-		self.blocks = []
+		self.blocks = CellSet(0, 0)
+		self.topology = None
+		self.pathfinder = None
+		self.search = IterativeDeepening()
 
 	def new_game(self, map_list, blocks_list, bombers, player_index):
 		'''
 		Called when a new game starts.
 		
-		map_list: a list of lists that describes the map at the start of the game
+		map_list: a Grid that describes the map at the start of the game
 
 			e.g.
 				map_list[1][2] would return the MapItem occupying position (1, 2)
+				map_list.get(1, 2) would return the tile code (see Grid.py) of position (1, 2), which is much faster
 
 		blocks_list: a list of tuples which indicates a block occupies the position indicated by the tuple
 
@@ -42,7 +56,13 @@ class PlayerAI():
 			bombers[player_index][0] returns your starting position
 
 		'''
-		self.blocks = blocks_list[:]
+		# the blocks still standing, as a CellSet so lookups don't scan the (early on, long) list
+		self.blocks = CellSet(map_list.width, map_list.height, blocks_list)
+		# walls never change, so everything that depends on them is worked out once per game
+		self.topology = Topology(map_list)
+		self.pathfinder = PathFinder(map_list, SAFE_WALKABLE_CODES, self.topology.neighbours)
+		self.search.pathfinder = self.pathfinder
+		self.search.topology = self.topology
 
 	def get_move(self, map_list, bombs, powerups, bombers, explosion_list, player_index, move_number):
 		'''
@@ -54,6 +74,33 @@ class PlayerAI():
 			traceback.print_exc()
 			#raise
 			return Directions['still'].action
+
+	def get_move_view(self, view):
+		'''
+		Used instead of get_move when the client has it, with the MessageView of the turn, whose fields
+		are only built when read. This AI never looks at the powerups, so they are left unbuilt.
+		'''
+		return self.get_move(view.map_list, view.bombs, None, view.bombers, view.explosions, view.playerNum, view.responseID)
+
+	def get_move_anytime(self,map_list, bombs, powerups, bombers, explosion_list, player_index, move_number):
+		'''
+		Used instead of get_move when the client runs with a turn deadline. Takes the same arguments as get_move.
+
+		A generator which yields the move of the one-shot heuristic first, then the best move found at
+		each depth the search completes; a deeper search may well pick a move the heuristic scores lower.
+		When the deadline hits, the client sends the last move yielded, the one from the deepest completed
+		depth, and stops iterating.
+		'''
+		move = self.get_move(map_list, bombs, powerups, bombers, explosion_list, player_index, move_number)
+		yield move
+
+		# get_move_real leaves our bomb in bombs and map_list when it places one, and only then
+		bombMove = move in BOMB_ACTIONS
+		try:
+			for direction in self.search.search(map_list, bombs, bombers, player_index):
+				yield direction.bombaction if bombMove else direction.action
+		except:
+			traceback.print_exc()
 			
 
 	def get_move_real(self, map_list, bombs, powerups, bombers, explosion_list, player_index, move_number):
@@ -64,8 +111,9 @@ class PlayerAI():
 		Defaults to STAY_PUT if a string value that is not associated with a move/bomb move action is passed back. 
 
 		Args: 
-			map_list: a list of lists that describes the current map
+			map_list: a Grid that describes the current map
 				map_list[0][0] would return the MapItem occupying position (0, 0)
+				map_list.get(0, 0) would return the tile code of position (0, 0)
 			
 			bombs: a dictionary that contains information of bombs currently on the map. 
 				key: a tuple of the bomb's location
@@ -104,10 +152,8 @@ class PlayerAI():
 		bombMove = False
 		my_position = bombers[player_index]['position']
 
-		# updating the list of blocks
-		for explosion in explosion_list:
-			if explosion in self.blocks: 
-				self.blocks.remove(explosion)
+		# updating the set of blocks
+		self.blocks.discard_all(explosion_list)
 
 		validmoves = []
 		neighbour_blocks = [] 
@@ -118,8 +164,7 @@ class PlayerAI():
 			y = my_position[1] + move.dy
 
 			# Checks to see if neighbours are walkable, and stores the neighbours which are blocks
-			if map_list[x][y] in SAFE_WALKABLE:
-				# walkable is a list in enums.py which indicates what type of tiles are walkable
+			if SAFE_WALKABLE_CODES[map_list.get(x, y)]:
 				validmoves.append(move)
 			elif (x, y) in self.blocks: 
 				neighbour_blocks.append((x, y))
@@ -144,12 +189,14 @@ class PlayerAI():
 			my_bomb_count += 1
 
 		if bombMove:
+			# placed tentatively so the checks below see it, taken back if we end up staying put
+			replaced = (bombs.get(my_position), map_list.get(my_position[0], my_position[1]))
 			bombs[(my_position[0], my_position[1])] = {
 				'owner' : player_index,
 				'range' : bombers[player_index]['bomb_range'],
 				'time_left': 16
 			}
-			map_list[my_position[0]][my_position[1]] = Enums.MapItems.BOMB
+			map_list.set(my_position[0], my_position[1], BOMB)
 
 		validmoves2 = []
 		for m in validmoves:
@@ -161,8 +208,23 @@ class PlayerAI():
 
 		validmoves = validmoves2
 
+		# prefer moves from which a cell out of every blast can be reached before the first bomb goes off
+		if len(bombs) > 0:
+			safe = safe_mask(map_list, bombs, SAFE_WALKABLE_CODES, self.topology)
+			fuse = min(bomb['time_left'] for bomb in bombs.values())
+			escapes = [m for m in validmoves if canEscape(map_list.index(my_position[0] + m.dx, my_position[1] + m.dy), map_list, safe, self.topology.neighbours, fuse)]
+			if len(escapes) > 0:
+				validmoves = escapes
+
 		# there's no where to move to
 		if len(validmoves) == 0: 
+			if bombMove:
+				(bomb, code) = replaced
+				if bomb is None:
+					del bombs[my_position]
+				else:
+					bombs[my_position] = bomb
+				map_list.set(my_position[0], my_position[1], code)
 			return Directions['still'].action
 
 		# can move somewhere, so choose a tile randomly
@@ -170,11 +232,12 @@ class PlayerAI():
 		awayfrombombmoves = []
 
 		# avoid bombs by maximizing our distance to bomb
+		danger = DangerMap(map_list, bombs, self.topology)
 		currentBestDist = 0
 		for m in validmoves:
 			x = my_position[0] + m.dx
 			y = my_position[1] + m.dy
-			disttobomb = distToNearestBomb(x, y, bombs, map_list)
+			disttobomb = distToNearestBomb(x, y, bombs, map_list, danger)
 			# print(disttobomb)
 			if disttobomb > currentBestDist:
 				awayfrombombmoves = [m]
@@ -209,7 +272,7 @@ class PlayerAI():
 		else: 
 			return move.action
 
-def path_exists(start, end, map_list):
+def path_exists(start, end, map_list, field=None):
 	''' 
 	Takes two tuples that represents the starting, ending point and the currenet map to determine if a path between the two points exists on the map. 
 
@@ -219,29 +282,12 @@ def path_exists(start, end, map_list):
 	Args: 
 		start: a tuple which correspond to the starting point of the paths
 		end: a tuple which correspond to the ending point of the path.
+		field: a Pathing.DistanceField computed from start for this turn. 
+			When asking about many end points, compute it once and pass it in (or query it directly).
 	'''
-	open_list = [start]
-	visited = []
-
-	while len(open_list) != 0:
-		current = open_list.pop(0)
-
-		for direction in Directions.values():
-			x = current[0] + direction.dx
-			y = current[1] + direction.dy
-
-			if (x, y) == end: 
-				return True
-
-			if (x, y) in visited: 
-				continue
-
-			if map_list[x][y] in SAFE_WALKABLE: 
-				open_list.append((x, y))
-
-			visited.append((x, y))
-
-	return False
+	if field is None:
+		field = DistanceField(map_list, start, SAFE_WALKABLE_CODES)
+	return field.touches(end)
 
 def manhattan_distance(start, end):
 	'''
@@ -253,138 +299,49 @@ def manhattan_distance(start, end):
 	'''
 	return (abs(start[0]-end[0])+abs(start[1]-end[1]))
 
-def find_path(start, end, map_list):
-	''' Finds the closest path from point a to point b.
-	based on http://theory.stanford.edu/~amitp/game-programming/a-star-flash/Pathfinder.as
-Original code under MIT license, attached:
-<http://www.opensource.org/licenses/mit-license.php>
-
-Permission is hereby granted, free of charge, to any person obtaining 
-a copy of this software and associated documentation files (the 
-"Software"), to deal in the Software without restriction, including 
-without limitation the rights to use, copy, modify, merge, publish, 
-distribute, sublicense, and/or sell copies of the Software, and to 
-permit persons to whom the Software is furnished to do so, subject to 
-the following conditions: 
-  
-The above copyright notice and this permission notice shall be included 
-in all copies or substantial portions of the Software. 
-  
-THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, 
-EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF 
-MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. 
-IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY 
-CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, 
-TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE 
-SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+def find_path(start, end, map_list, pathfinder=None):
+	'''
+	Finds the shortest path from start to end through SAFE_WALKABLE tiles.
+
+	Returns a list of the positions on the path going from end back towards start (start not included),
+	or None if there is no path.
 
+	Args:
+		start: a tuple which correspond to the starting point of the path
+		end: a tuple which correspond to the ending point of the path
+		pathfinder: a Pathing.PathFinder built for this map, e.g. PlayerAI.pathfinder.
+			Pass it whenever possible, otherwise one is built for every call.
 	'''
-	# g = already travelled, h = approx. how much to travel still, 
-	initialobj = {'node': start, 'open': True, 'closed': False, 'parent': None, 'g': 0, 'h': manhattan_distance(start, end), 'f': manhattan_distance(start, end)}
-	bopen = [initialobj]
-	bvisited = {initialobj['node']: initialobj}
-	while len(bopen) > 0:
-		bopen.sort(key=lambda a: a['f']) # sort the array to find the one with the lowest approximate distance to the goal
-		best = bopen.pop(0)
-		best['open'] = False
-		if best['node'] == end: # finished
-			# todo retrace the path
-			
-			return retrace_path(bvisited, best, start)
-		for direction in Directions.values():
-			if direction == STILL:
-				continue
-			x = best['node'][0] + direction.dx
-			y = best['node'][1] + direction.dy
-			if not map_list[x][y] in SAFE_WALKABLE:
-				continue
-			newnode = (x, y)
-			dist = manhattan_distance(best['node'], newnode)
-			nodeobj = None
-			try:
-				nodeobj = bvisited[newnode]
-			except KeyError:
-				nodeobj = {'node': newnode, 'open': False, 'closed': False, 'parent': best, 'g': 999999, 'h': 999999, 'f': 999999}
-				bvisited[newnode] = nodeobj
-			# calculate the new g value - already travelled
-			new_g = best['g'] + dist
-			if new_g < nodeobj['g']: # first time seeing it or new cost is better than old cost (taking different path)
-						# if true, use this path to travel to it
-				if not nodeobj['open']:
-					nodeobj['open'] = True
-					bopen.append(nodeobj)
-				nodeobj['g'] = new_g # update to the shorter value
-				nodeobj['h'] = manhattan_distance(newnode, end)
-				nodeobj['f'] = new_g + nodeobj['h']
-				nodeobj['parent'] = best
-	return None
-
-def retrace_path(bvisited, best, start):
-	path = []
-	curvisited = best
-	while curvisited != None and curvisited['node'] != start:
-		path.append(curvisited['node'])
-		curvisited = curvisited['parent']
-	return path
-
-def findAllPossibleExplosionPoints(bombs, block):
+	if pathfinder is None:
+		pathfinder = PathFinder(map_list, SAFE_WALKABLE_CODES)
+	return pathfinder.find_path(start, end, map_list)
+
+def findAllPossibleExplosionPoints(bombs, block, topology=None):
 	locs = []
-	explosioncanspread = [Enums.MapItems.BLANK, Enums.MapItems.POWERUP, Enums.MapItems.BOMB]
 	for blocation in bombs:
-		b = bombs[blocation]
-		bx = blocation[0]
-		by = blocation[1]
-		brange = b['range']
-		for xr in range(-brange, brange + 1):
-			blockatloc = block[bx + xr][by]
-			if blockatloc in explosioncanspread:
-				locs.append((bx+xr, by))
-		for yr in range(-brange, brange + 1):
-			blockatloc = block[bx][by + yr]
-			if blockatloc in explosioncanspread:
-				locs.append((bx, by+yr))
+		locs.extend(findPossibleExplosionPoints(blocation, bombs, block, topology))
 	return locs
 
-def findPossibleExplosionPoints(blocation, bombs, block):
-	locs = []
-	explosioncanspread = [Enums.MapItems.BLANK, Enums.MapItems.POWERUP, Enums.MapItems.BOMB]
-	b = bombs[blocation]
-	bx = blocation[0]
-	by = blocation[1]
-	brange = b['range']
-	for xr in range(-brange, brange + 1):
-		try:
-			blockatloc = block[bx + xr][by]
-			if blockatloc in explosioncanspread:
-				locs.append((bx+xr, by))
-		except IndexError:
-			pass
-	for yr in range(-brange, brange + 1):
-		try:
-			blockatloc = block[bx][by + yr]
-			if blockatloc in explosioncanspread:
-				locs.append((bx, by+yr))
-		except IndexError:
-			pass
-	return locs
+def findPossibleExplosionPoints(blocation, bombs, block, topology=None):
+	'''
+	Returns the positions the explosion of the bomb at blocation reaches, stopping at walls and blocks.
 
-def distToNearestBomb(x, y, bombs, block):
-	mindist = 99999
-	minbomb = None
-	for blocation in bombs:
-		b = bombs[blocation]
-		bx = blocation[0]
-		by = blocation[1]
-		brange = b['range']
-		explosionlocs = findPossibleExplosionPoints(blocation, bombs, block)
-		if not (x, y) in explosionlocs:
-			continue
-		# can explode on us
-		distToUs = abs(x - bx) if y == by else abs(y - by)
-		if distToUs < mindist:
-			minbomb = blocation
-			mindist = distToUs
-	return mindist
+	topology: the Topology of the map, e.g. PlayerAI.topology, so walls are looked up instead of read off the map.
+	'''
+	h = block.height
+	return [(i // h, i % h) for (i, distance) in blast_cells(block, blocation, bombs[blocation]['range'], topology)]
+
+def distToNearestBomb(x, y, bombs, block, danger=None):
+	'''
+	Returns the distance from (x, y) to the closest bomb whose explosion reaches (x, y), or 99999 if none does.
+
+	danger: the DangerMap of bombs on this turn. Build it once per turn and pass it in, otherwise
+		it is rebuilt on every call.
+	'''
+	if danger is None:
+		danger = DangerMap(block, bombs)
+	mindist = danger.nearest_at(x, y)
+	return mindist if mindist != NEVER else 99999
 
 def countBombs(bombs):
 	players = {}
@@ -397,6 +354,29 @@ def countBombs(bombs):
 			players[bowner] = 1
 	return players
 
+def canEscape(start, map_list, safe, neighbours, limit):
+	'''
+	Returns True if a cell marked in safe (see BoardArrays.safe_mask) can be reached from the cell
+	index start in at most limit steps over walkable cells.
+	'''
+	if safe[start]:
+		return True
+	cells = map_list.cells
+	seen = set([start])
+	frontier = [start]
+	for step in range(limit):
+		reached = []
+		for i in frontier:
+			for j in neighbours[i]:
+				if j in seen or not SAFE_WALKABLE_CODES[cells[j]]:
+					continue
+				if safe[j]:
+					return True
+				seen.add(j)
+				reached.append(j)
+		frontier = reached
+	return False
+
 def findValidMoves(map_list, xinitial, yinitial, bombs):
 	'''
 	Returns a list of valid directions (not still!) from a given X and Y value.
@@ -409,8 +389,80 @@ def findValidMoves(map_list, xinitial, yinitial, bombs):
 		y = yinitial + move.dy
 
 		# Checks to see if neighbours are walkable, and stores the neighbours which are blocks
-		if map_list[x][y] in SAFE_WALKABLE and not bombs.has_key((x, y)):
-			# walkable is a list in enums.py which indicates what type of tiles are walkable
+		if SAFE_WALKABLE_CODES[map_list.get(x, y)] and not bombs.has_key((x, y)):
 			validmoves.append(move)
 	#print(len(validmoves))
 	return validmoves
+
+class IterativeDeepening():
+	'''
+	Looks further ahead one ply at a time, assuming the enemy stays put and no new bombs are placed.
+
+	Since the bombs tick the same way whatever we do, the state after a number of plies is just our position,
+	so every ply keeps the set of positions we can be alive at, together with the first moves that lead there.
+	After each ply the best first move is yielded, based on how safe and how close to the enemy the
+	positions reachable at that depth are. Distances to the enemy come from one DistanceField per search.
+	'''
+	def __init__(self, max_depth=16):
+		self.max_depth = max_depth
+		self.pathfinder = None
+		self.topology = None
+
+	def search(self, map_list, bombs, bombers, player_index):
+		'''
+		Generator which yields the best first move (a Direction) after every completed depth.
+		'''
+		my_position = bombers[player_index]['position']
+		enemy_position = bombers[1 if player_index == 0 else 0]['position']
+		neighbours = self.topology.neighbours if self.topology is not None else None
+		self.enemy_field = DistanceField(map_list, enemy_position, SAFE_WALKABLE_CODES, neighbours)
+
+		# cells that explode at each ply, chain reactions included
+		danger = DangerMap(map_list, bombs, self.topology)
+		explodes_at = danger.exploding_at()
+
+		moves = [d for d in Directions.values()]
+		scores = {}
+		layer = {my_position: set()}
+		for depth in range(1, self.max_depth + 1):
+			exploding = explodes_at.get(depth, ())
+			remaining = len([t for t in danger.detonations.values() if t > depth])
+			nextlayer = {}
+			for (x, y) in layer:
+				for move in moves:
+					nx = x + move.dx
+					ny = y + move.dy
+					if move != STILL and not SAFE_WALKABLE_CODES[map_list.get(nx, ny)]:
+						continue
+					if (nx, ny) in exploding:
+						continue
+					first = layer[(x, y)] if depth > 1 else set([move])
+					nextlayer.setdefault((nx, ny), set()).update(first)
+			if len(nextlayer) == 0:
+				# every line of play dies, stick with the last answer
+				return
+			layer = nextlayer
+
+			best = None
+			bestscore = None
+			for position in layer:
+				key = (position, remaining)
+				if key not in scores:
+					scores[key] = self.evaluate(position, enemy_position, danger, depth)
+				if bestscore is None or scores[key] > bestscore:
+					bestscore = scores[key]
+					best = position
+			yield sorted(layer[best], key=lambda d: d.name)[0]
+
+	def evaluate(self, position, enemy_position, danger, depth):
+		'''
+		Higher is better: out of the way of the bombs still to explode after depth first, then close to the enemy.
+		'''
+		safety = 10
+		for (t, distance) in danger.hits_at(position[0], position[1]):
+			if t > depth and distance < safety:
+				safety = distance
+		distance = self.enemy_field.distance(position)
+		if distance is None:
+			distance = manhattan_distance(position, enemy_position) + 10
+		return safety * 100 - distance
@@ -0,0 +1,235 @@
+from Grid import *
+from Direction import *
+
+# the directions Bitboard.step moves sets of cells in, by number
+BIT_DIRECTIONS = (UP, DOWN, LEFT, RIGHT)
+
+# turns a bomb takes to explode, as in bombman.jar
+BOMB_FUSE = 16
+
+class BitState(object):
+	'''
+	Everything that changes during a game, as far as lookahead is concerned.
+
+	blocks: int, the set of cells holding blocks
+	bombs: tuple of (cell index, range, time left, owner) sorted by cell index
+	bombers: tuple of (cell index, bomb range, bombs left) for each player
+	alive: tuple of booleans for each player
+
+	States are immutable and can be hashed, so they can be counted or used as keys.
+	'''
+	__slots__ = ('blocks', 'bombs', 'bombers', 'alive', 'bomb_bits')
+
+	def __init__(self, blocks, bombs, bombers, alive):
+		self.blocks = blocks
+		self.bombs = bombs
+		self.bombers = bombers
+		self.alive = alive
+		bomb_bits = 0
+		for bomb in bombs:
+			bomb_bits |= 1 << bomb[0]
+		self.bomb_bits = bomb_bits
+
+	def key(self):
+		return (self.blocks, self.bombs, self.bombers, self.alive)
+
+	def __eq__(self, other):
+		return self.key() == other.key()
+
+	def __ne__(self, other):
+		return not self.__eq__(other)
+
+	def __hash__(self):
+		return hash(self.key())
+
+	def finished(self):
+		return not all(self.alive)
+
+class Bitboard(object):
+	'''
+	A map held as Python integers used as bit sets: bit x * height + y stands for cell (x, y)
+	(see Grid.index). A set of cells is one int, so moving every cell of a set one step is a
+	shift and a mask, and the moves of a bomber, the spread of a blast or the cells a set of
+	bombs reaches come out of a handful of integer operations whatever the number of cells.
+
+	Only the walls are kept here, they never change; blocks, bombs and bombers are in a BitState.
+	Powerups are left out: they depend on chance.
+	'''
+	def __init__(self, grid):
+		w = grid.width
+		h = grid.height
+		cells = grid.cells
+		self.width = w
+		self.height = h
+		self.full = (1 << (w * h)) - 1
+		walls = 0
+		for i in range(w * h):
+			if cells[i] == WALL:
+				walls |= 1 << i
+		self.walls = walls
+		self.open = self.full & ~walls
+		first_row = 0
+		for x in range(w):
+			first_row |= 1 << (x * h)
+		self.first_row = first_row
+		self.last_row = first_row << (h - 1)
+
+	def bits(self, positions):
+		'''
+		Returns the set of positions as an int.
+		'''
+		h = self.height
+		bits = 0
+		for (x, y) in positions:
+			bits |= 1 << (x * h + y)
+		return bits
+
+	def positions(self, bits):
+		'''
+		Returns the list of positions in the set bits.
+		'''
+		h = self.height
+		result = []
+		while bits:
+			low = bits & -bits
+			i = low.bit_length() - 1
+			result.append((i // h, i % h))
+			bits ^= low
+		return result
+
+	def step(self, bits, direction):
+		'''
+		Returns the set of cells one step away from bits in BIT_DIRECTIONS[direction], dropping those
+		that would leave the map.
+		'''
+		if direction == 0:
+			return (bits & ~self.first_row) >> 1
+		if direction == 1:
+			return (bits & ~self.last_row) << 1
+		if direction == 2:
+			return bits >> self.height
+		return (bits << self.height) & self.full
+
+	def blast(self, bombs, blocks):
+		'''
+		Returns the set of cells reached by the explosions of bombs, a list of (cell index, range),
+		spreading through open cells and stopping on the first block (see DangerMap.blast_cells).
+		'''
+		groups = {}
+		for (i, brange) in bombs:
+			groups[brange] = groups.get(brange, 0) | (1 << i)
+		open_cells = self.open
+		passable = open_cells & ~blocks
+		covered = 0
+		for brange in groups:
+			origin = groups[brange]
+			covered |= origin
+			for direction in range(4):
+				front = origin
+				for distance in range(brange):
+					front = self.step(front, direction) & open_cells
+					covered |= front
+					# blocks are hit but stop the blast
+					front &= passable
+					if not front:
+						break
+		return covered
+
+	def state(self, grid, bombs, bombers):
+		'''
+		Returns the BitState of a turn from what get_move receives.
+		'''
+		h = self.height
+		blocks = 0
+		cells = grid.cells
+		for i in range(len(cells)):
+			if cells[i] == BLOCK:
+				blocks |= 1 << i
+		bitbombs = tuple(sorted((x * h + y, bombs[(x, y)]['range'], bombs[(x, y)]['time_left'], bombs[(x, y)]['owner']) for (x, y) in bombs))
+		players = sorted(bombers)
+		bitbombers = tuple((bombers[p]['position'][0] * h + bombers[p]['position'][1], bombers[p]['bomb_range'], bombers[p]['bomb_count']) for p in players)
+		return BitState(blocks, bitbombs, bitbombers, tuple(True for p in players))
+
+	def actions(self, state, player):
+		'''
+		Returns a list of (action, cell index moved to, places a bomb) for every move player can make.
+		'''
+		(position, brange, left) = state.bombers[player]
+		bit = 1 << position
+		free = self.open & ~state.blocks & ~state.bomb_bits
+		bomb = left > 0 and not (bit & state.bomb_bits)
+		result = [(STILL.action, position, False)]
+		if bomb:
+			result.append((STILL.bombaction, position, True))
+		for direction in range(4):
+			if self.step(bit, direction) & free:
+				d = BIT_DIRECTIONS[direction]
+				to = position + d.dx * self.height + d.dy
+				result.append((d.action, to, False))
+				if bomb:
+					# our own bomb doesn't stop us from stepping off it, but it does stop the other bomber
+					result.append((d.bombaction, to, True))
+		return result
+
+	def successor(self, state, moves):
+		'''
+		Returns the BitState after one turn in which every player makes its move, a tuple from actions.
+		Bombs are placed, then the bombers move, then the fuses tick and bombs explode, as in the simulator.
+		'''
+		bombs = list(state.bombs)
+		bombers = list(state.bombers)
+		bomb_bits = state.bomb_bits
+		for player in range(len(moves)):
+			(action, to, places) = moves[player]
+			(position, brange, left) = bombers[player]
+			if places and state.alive[player] and not (bomb_bits >> position) & 1:
+				bombs.append((position, brange, BOMB_FUSE, player))
+				bomb_bits |= 1 << position
+				bombers[player] = (position, brange, left - 1)
+		free = self.open & ~state.blocks & ~bomb_bits
+		for player in range(len(moves)):
+			(action, to, places) = moves[player]
+			(position, brange, left) = bombers[player]
+			if state.alive[player] and to != position and (free >> to) & 1:
+				bombers[player] = (to, brange, left)
+
+		blocks = state.blocks
+		ticked = [(i, brange, time_left - 1, owner) for (i, brange, time_left, owner) in bombs]
+		exploding = [(i, brange) for (i, brange, time_left, owner) in ticked if time_left <= 0]
+		covered = 0
+		exploded = 0
+		while exploding:
+			for (i, brange) in exploding:
+				exploded |= 1 << i
+			covered |= self.blast(exploding, blocks)
+			# bombs caught in a blast go off with it
+			exploding = [(i, brange) for (i, brange, time_left, owner) in ticked if (covered >> i) & 1 and not (exploded >> i) & 1]
+		remaining = []
+		for bomb in ticked:
+			if (exploded >> bomb[0]) & 1:
+				(position, brange, left) = bombers[bomb[3]]
+				bombers[bomb[3]] = (position, brange, left + 1)
+			else:
+				remaining.append(bomb)
+		alive = tuple(state.alive[player] and not (covered >> bombers[player][0]) & 1 for player in range(len(bombers)))
+		return BitState(blocks & ~covered, tuple(sorted(remaining)), tuple(bombers), alive)
+
+	def successors(self, state):
+		'''
+		Yields every (moves, BitState) one turn after state, for every combination of the players' moves.
+		'''
+		if state.finished():
+			return
+		choices = [[]]
+		for player in range(len(state.bombers)):
+			choices = [c + [move] for c in choices for move in self.actions(state, player)]
+		for moves in choices:
+			yield (moves, self.successor(state, moves))
+
+	def perft(self, state, depth):
+		'''
+		Returns the number of move sequences of depth turns from state, counting a finished game as a leaf.
+		'''
+		if depth == 0 or state.finished():
+			return 1
+		return sum(self.perft(child, depth - 1) for (moves, child) in self.successors(state))
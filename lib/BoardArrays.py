@@ -0,0 +1,111 @@
+'''
+Whole-board analysis done as array operations with NumPy when it is installed, and with the pure
+Python loops otherwise. Both give the same answers in a flat sequence indexed by cell index (see
+Grid.index): a numpy array with NumPy, a bytearray or array('i') without it.
+
+With NumPy the cost of a call hardly grows with the size of the map, which matters on large
+custom maps; on the standard 17x17 map the Python versions are about as fast. PlayerAI checks every turn with
+safe_mask which of its moves still leave a way out of the blasts.
+'''
+from array import array
+
+from Grid import *
+from DangerMap import blast_cells
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+HAVE_NUMPY = numpy is not None
+
+# the directions blasts spread in, as in blast_cells
+_DIRECTIONS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+def python_blast_coverage(grid, bombs, topology=None):
+	'''
+	Returns, for every cell index, whether the explosion of any of bombs reaches the cell.
+	topology: the Topology of the map, only used by the Python version.
+	'''
+	coverage = bytearray(grid.width * grid.height)
+	for position in bombs:
+		for (i, distance) in blast_cells(grid, position, bombs[position]['range'], topology):
+			coverage[i] = 1
+	return coverage
+
+def python_manhattan_field(grid, position):
+	'''
+	Returns, for every cell index, the Manhattan distance from the cell to position.
+	'''
+	h = grid.height
+	px, py = position
+	field = array('i')
+	for x in range(grid.width):
+		dx = abs(x - px)
+		field.extend([dx + abs(y - py) for y in range(h)])
+	return field
+
+def python_safe_mask(grid, bombs, walkable, topology=None):
+	'''
+	Returns, for every cell index, whether the cell holds a tile in walkable (a code_table)
+	and is out of reach of every bomb in bombs.
+	'''
+	coverage = python_blast_coverage(grid, bombs, topology)
+	cells = grid.cells
+	mask = bytearray(len(cells))
+	for i in range(len(cells)):
+		if walkable[cells[i]] and not coverage[i]:
+			mask[i] = 1
+	return mask
+
+def _codes(grid):
+	return numpy.frombuffer(bytes(grid.cells), dtype=numpy.uint8).reshape(grid.width, grid.height)
+
+def _shift(a, dx, dy):
+	'''
+	Returns a moved one cell by (dx, dy), filling in with zeros.
+	'''
+	(w, h) = a.shape
+	out = numpy.zeros_like(a)
+	out[max(dx, 0):w + min(dx, 0), max(dy, 0):h + min(dy, 0)] = a[max(-dx, 0):w + min(-dx, 0), max(-dy, 0):h + min(-dy, 0)]
+	return out
+
+def numpy_blast_coverage(grid, bombs, topology=None):
+	codes = _codes(grid)
+	walls = codes == WALL
+	passes = ~(walls | (codes == BLOCK))
+	ranges = numpy.zeros(codes.shape, dtype=numpy.int32)
+	# a bomb's own cell is covered whatever its range, as in blast_cells
+	covered = numpy.zeros(codes.shape, dtype=bool)
+	for (x, y) in bombs:
+		ranges[x, y] = max(ranges[x, y], bombs[(x, y)]['range'])
+		covered[x, y] = True
+	steps = int(ranges.max()) if bombs else 0
+	for (dx, dy) in _DIRECTIONS:
+		# carry holds how much further a blast can go from each cell, every step moves it on by one cell
+		carry = ranges
+		for step in range(steps):
+			entering = _shift(carry, dx, dy)
+			entering[walls] = 0
+			covered |= entering > 0
+			carry = numpy.maximum(numpy.where(passes, entering - 1, 0), ranges)
+	return covered.ravel()
+
+def numpy_manhattan_field(grid, position):
+	px, py = position
+	xs = numpy.abs(numpy.arange(grid.width, dtype=numpy.int32) - px)
+	ys = numpy.abs(numpy.arange(grid.height, dtype=numpy.int32) - py)
+	return (xs[:, None] + ys[None, :]).ravel()
+
+def numpy_safe_mask(grid, bombs, walkable, topology=None):
+	walkable = numpy.frombuffer(bytes(walkable), dtype=numpy.uint8).astype(bool)
+	return walkable[_codes(grid).ravel()] & ~numpy_blast_coverage(grid, bombs, topology)
+
+if HAVE_NUMPY:
+	blast_coverage = numpy_blast_coverage
+	manhattan_field = numpy_manhattan_field
+	safe_mask = numpy_safe_mask
+else:
+	blast_coverage = python_blast_coverage
+	manhattan_field = python_manhattan_field
+	safe_mask = python_safe_mask
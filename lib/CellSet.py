@@ -0,0 +1,82 @@
+class CellSet(object):
+	'''
+	A set of positions on a width x height map, kept as one flag per cell index (see Grid.index)
+	together with the number of flags set, so membership, adding, removing and len() are all O(1)
+	whatever the number of positions in the set.
+
+	Positions are tuples (x, y). Positions outside the map are never in the set.
+	'''
+	__slots__ = ('width', 'height', 'flags', 'count')
+
+	def __init__(self, width, height, positions=()):
+		self.width = width
+		self.height = height
+		self.flags = bytearray(width * height)
+		self.count = 0
+		self.update(positions)
+
+	def __contains__(self, position):
+		x, y = position
+		return 0 <= x < self.width and 0 <= y < self.height and self.flags[x * self.height + y] == 1
+
+	def __len__(self):
+		return self.count
+
+	def __iter__(self):
+		h = self.height
+		flags = self.flags
+		for i in range(len(flags)):
+			if flags[i]:
+				yield (i // h, i % h)
+
+	def add(self, position):
+		x, y = position
+		if not (0 <= x < self.width and 0 <= y < self.height):
+			raise KeyError(position)
+		i = x * self.height + y
+		if not self.flags[i]:
+			self.flags[i] = 1
+			self.count += 1
+
+	def discard(self, position):
+		'''
+		Removes position if it is in the set. Returns True if it was.
+		'''
+		x, y = position
+		if not (0 <= x < self.width and 0 <= y < self.height):
+			return False
+		i = x * self.height + y
+		if not self.flags[i]:
+			return False
+		self.flags[i] = 0
+		self.count -= 1
+		return True
+
+	def update(self, positions):
+		for position in positions:
+			self.add(position)
+
+	def discard_all(self, positions):
+		'''
+		Removes every position of positions that is in the set, e.g. the explosion list of a turn.
+		Returns the number of positions removed.
+		'''
+		w = self.width
+		h = self.height
+		flags = self.flags
+		removed = 0
+		for (x, y) in positions:
+			if 0 <= x < w and 0 <= y < h and flags[x * h + y]:
+				flags[x * h + y] = 0
+				removed += 1
+		self.count -= removed
+		return removed
+
+	def copy(self):
+		other = CellSet(self.width, self.height)
+		other.flags[:] = self.flags
+		other.count = self.count
+		return other
+
+	def to_list(self):
+		return list(self)
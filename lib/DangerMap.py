@@ -0,0 +1,136 @@
+import heapq
+from array import array
+
+from Grid import *
+
+# time and distance of cells no bomb reaches
+NEVER = 0x7fffffff
+
+# tiles that stop a blast without being hit, and tiles that are hit but stop it
+BLAST_STOPPED_BY = code_table([WALL])
+BLAST_ABSORBED_BY = code_table([BLOCK])
+
+def blast_cells(grid, position, brange, topology=None):
+	'''
+	Returns a list of (cell index, distance) for every cell the explosion of a bomb at position with
+	range brange reaches. The blast spreads from the bomb in the four directions and stops before a wall
+	or on the first block, which it destroys.
+
+	topology: the Topology of the map. With it the walls are not looked at, the rays say how far
+		the blast can go.
+	'''
+	h = grid.height
+	w = grid.width
+	cells = grid.cells
+	bx, by = position
+	start = bx * h + by
+	result = [(start, 0)]
+	if topology is not None:
+		rays = topology.rays
+		steps = topology.steps
+		for k in range(4):
+			i = start
+			step = steps[k]
+			for distance in range(1, min(brange, rays[k][start]) + 1):
+				i += step
+				result.append((i, distance))
+				if BLAST_ABSORBED_BY[cells[i]]:
+					break
+		return result
+	for (dx, dy) in ((0, -1), (0, 1), (-1, 0), (1, 0)):
+		x = bx
+		y = by
+		for distance in range(1, brange + 1):
+			x += dx
+			y += dy
+			if not (0 <= x < w and 0 <= y < h):
+				break
+			code = cells[x * h + y]
+			if BLAST_STOPPED_BY[code]:
+				break
+			result.append((x * h + y, distance))
+			if BLAST_ABSORBED_BY[code]:
+				break
+	return result
+
+class DangerMap(object):
+	'''
+	For every cell of the map, the earliest time (in turns from now) an explosion will reach it and the
+	distance to the closest bomb that reaches it, worked out once for all bombs.
+
+	Chain reactions are accounted for: a bomb caught in another bomb's blast detonates at the same time.
+	Blocks destroyed by one blast are still treated as stopping later blasts.
+
+	detonations: dictionary { position : time the bomb explodes }
+	blasts: dictionary { position : list of the cell indices the bomb's explosion reaches }
+
+	Pass the Topology of the map, if there is one, to look walls up in its rays.
+	'''
+	def __init__(self, grid, bombs, topology=None):
+		self.width = grid.width
+		self.height = grid.height
+		h = self.height
+		n = self.width * h
+		time = array('i', [NEVER]) * n
+		nearest = array('i', [NEVER]) * n
+		hits = {}
+		detonations = {}
+		blasts = {}
+
+		heap = [(bombs[position]['time_left'], position) for position in bombs]
+		heapq.heapify(heap)
+		while heap:
+			(t, position) = heapq.heappop(heap)
+			if position in detonations:
+				continue
+			detonations[position] = t
+			reached = blast_cells(grid, position, bombs[position]['range'], topology)
+			blasts[position] = [i for (i, distance) in reached]
+			for (i, distance) in reached:
+				if t < time[i]:
+					time[i] = t
+				if distance < nearest[i]:
+					nearest[i] = distance
+				hits.setdefault(i, []).append((t, distance))
+				other = (i // h, i % h)
+				if other in bombs and other not in detonations:
+					heapq.heappush(heap, (t, other))
+
+		self.time = time
+		self.nearest = nearest
+		self.hits = hits
+		self.detonations = detonations
+		self.blasts = blasts
+
+	def time_at(self, x, y):
+		'''
+		Returns the number of turns until (x, y) explodes, or NEVER.
+		'''
+		return self.time[x * self.height + y]
+
+	def nearest_at(self, x, y):
+		'''
+		Returns the distance from (x, y) to the closest bomb whose blast reaches it, or NEVER.
+		'''
+		return self.nearest[x * self.height + y]
+
+	def is_safe(self, x, y):
+		return self.time[x * self.height + y] == NEVER
+
+	def hits_at(self, x, y):
+		'''
+		Returns a list of (time, distance) for every bomb whose blast reaches (x, y).
+		'''
+		return self.hits.get(x * self.height + y, [])
+
+	def exploding_at(self):
+		'''
+		Returns a dictionary { time : set of positions exploding at that time }.
+		'''
+		h = self.height
+		result = {}
+		for position in self.blasts:
+			cells = result.setdefault(self.detonations[position], set())
+			for i in self.blasts[position]:
+				cells.add((i // h, i % h))
+		return result
@@ -0,0 +1,142 @@
+from Enums import *
+
+'''
+Small integer codes for every MapItem. A Grid stores one of these per cell.
+'''
+BLANK = 0
+BOMB = 1
+EXPLOSION = 2
+WALL = 3
+BLOCK = 4
+POWERUP = 5
+
+# code -> MapItem name, indexed by tile code
+ITEM_NAMES = (Enums.MapItems.BLANK, Enums.MapItems.BOMB, Enums.MapItems.EXPLOSION, Enums.MapItems.WALL, Enums.MapItems.BLOCK, Enums.MapItems.POWERUP)
+
+# MapItem name -> code
+ITEM_CODES = dict((name, code) for code, name in enumerate(ITEM_NAMES))
+
+def code_table(items):
+	'''
+	Returns a bytearray indexed by tile code which holds 1 for every code in items and 0 otherwise.
+	Use it to replace "map_list[x][y] in SOME_LIST" checks with a single index.
+
+	e.g.
+		SAFE = code_table([BLANK, POWERUP])
+		if SAFE[grid.get(x, y)]: ...
+	'''
+	table = bytearray(256)
+	for code in items:
+		table[code] = 1
+	return table
+
+class GridColumn(object):
+	'''
+	A view of a single column of a Grid so that grid[x][y] keeps working for bots written against the list of lists map.
+	Reading returns the MapItem name, writing accepts either a MapItem name or a tile code.
+	'''
+	__slots__ = ('cells', 'offset', 'height')
+
+	def __init__(self, grid, x):
+		self.cells = grid.cells
+		self.offset = x * grid.height
+		self.height = grid.height
+
+	def _index(self, y):
+		if y < 0:
+			y += self.height
+		if y < 0 or y >= self.height:
+			raise IndexError('grid column index out of range')
+		return self.offset + y
+
+	def __getitem__(self, y):
+		return ITEM_NAMES[self.cells[self._index(y)]]
+
+	def __setitem__(self, y, item):
+		self.cells[self._index(y)] = ITEM_CODES[item] if item in ITEM_CODES else item
+
+	def __len__(self):
+		return self.height
+
+	def __iter__(self):
+		for y in range(self.height):
+			yield self[y]
+
+class Grid(object):
+	'''
+	A compact representation of the map. Cells are stored column by column in a flat bytearray of tile codes,
+	so the cell at (x, y) lives at cells[x * height + y].
+
+	grid[x][y] returns the MapItem name of position (x, y) exactly like the old list of lists did.
+	AI code that cares about speed should use get/set and the tile codes instead.
+	'''
+	__slots__ = ('width', 'height', 'cells', '_columns')
+
+	def __init__(self, width, height, cells=None):
+		self.width = width
+		self.height = height
+		if cells is None:
+			cells = bytearray(width * height)
+		self.cells = cells
+		self._columns = None
+
+	@classmethod
+	def from_list(cls, map_list):
+		'''
+		Builds a Grid from a list of lists of MapItem names.
+		'''
+		width = len(map_list)
+		height = len(map_list[0]) if width > 0 else 0
+		grid = cls(width, height)
+		cells = grid.cells
+		i = 0
+		for column in map_list:
+			for item in column:
+				cells[i] = ITEM_CODES[item]
+				i += 1
+		return grid
+
+	def index(self, x, y):
+		return x * self.height + y
+
+	def in_bounds(self, x, y):
+		return 0 <= x < self.width and 0 <= y < self.height
+
+	def get(self, x, y):
+		'''
+		Returns the tile code at (x, y). No bounds checking is done.
+		'''
+		return self.cells[x * self.height + y]
+
+	def set(self, x, y, code):
+		self.cells[x * self.height + y] = code
+
+	def copy(self):
+		return Grid(self.width, self.height, bytearray(self.cells))
+
+	def to_list(self):
+		'''
+		Returns the map as a list of lists of MapItem names.
+		'''
+		names = ITEM_NAMES
+		cells = self.cells
+		h = self.height
+		return [[names[c] for c in cells[x * h:(x + 1) * h]] for x in range(self.width)]
+
+	def __getitem__(self, x):
+		if self._columns is None:
+			self._columns = [GridColumn(self, i) for i in range(self.width)]
+		return self._columns[x]
+
+	def __len__(self):
+		return self.width
+
+	def __iter__(self):
+		for x in range(self.width):
+			yield self[x]
+
+	def __eq__(self, other):
+		return isinstance(other, Grid) and self.width == other.width and self.height == other.height and self.cells == other.cells
+
+	def __ne__(self, other):
+		return not self.__eq__(other)
@@ -0,0 +1,160 @@
+import heapq
+from collections import deque
+from array import array
+
+from Grid import *
+
+# tiles nothing ever walks through or changes, so they can be left out of the neighbour tables
+STATIC_BLOCKED = code_table([WALL])
+
+def neighbour_table(grid):
+	'''
+	Returns a list which holds, for every cell index of grid (see Grid.index), a tuple of the
+	indices of the adjacent cells that are not walls. Cells on the border get no neighbours
+	outside the map.
+
+	Walls never change during a game, so the table can be built once per map.
+	'''
+	w = grid.width
+	h = grid.height
+	cells = grid.cells
+	table = []
+	for x in range(w):
+		for y in range(h):
+			neighbours = []
+			for (nx, ny) in ((x, y - 1), (x, y + 1), (x - 1, y), (x + 1, y)):
+				if 0 <= nx < w and 0 <= ny < h and not STATIC_BLOCKED[cells[nx * h + ny]]:
+					neighbours.append(nx * h + ny)
+			table.append(tuple(neighbours))
+	return table
+
+class PathFinder(object):
+	'''
+	A* over a Grid using integer cell indices, a binary heap for the open list
+	and flat g-cost/parent arrays.
+
+	Build one per map (e.g. in new_game) so the neighbour table is computed once.
+	walkable is a code_table of the tiles paths may go through.
+	expansions counts the nodes expanded over the life of the PathFinder.
+	neighbours: the neighbour_table of the map if already built, e.g. by a Topology.
+	'''
+	def __init__(self, grid, walkable, neighbours=None):
+		self.width = grid.width
+		self.height = grid.height
+		self.walkable = walkable
+		self.neighbours = neighbours if neighbours is not None else neighbour_table(grid)
+		self.expansions = 0
+
+	def find_path(self, start, end, grid):
+		'''
+		Returns the shortest path from start to end as a list of positions going from end back
+		towards start (start itself not included), or None if there is no path.
+		'''
+		h = self.height
+		n = self.width * h
+		cells = grid.cells
+		walkable = self.walkable
+		neighbours = self.neighbours
+		heappush = heapq.heappush
+		heappop = heapq.heappop
+
+		source = start[0] * h + start[1]
+		target = end[0] * h + end[1]
+		ex = end[0]
+		ey = end[1]
+
+		gcost = array('i', [n]) * n
+		parent = array('i', [-1]) * n
+		closed = bytearray(n)
+		gcost[source] = 0
+		openheap = [(abs(start[0] - ex) + abs(start[1] - ey), 0, source)]
+		expansions = 0
+		while openheap:
+			(f, g, current) = heappop(openheap)
+			if closed[current]:
+				continue
+			expansions += 1
+			if current == target:
+				self.expansions += expansions
+				path = []
+				while current != source:
+					path.append((current // h, current % h))
+					current = parent[current]
+				return path
+			closed[current] = 1
+			g += 1
+			for nb in neighbours[current]:
+				if g < gcost[nb] and walkable[cells[nb]]:
+					gcost[nb] = g
+					parent[nb] = current
+					heappush(openheap, (g + abs(nb // h - ex) + abs(nb % h - ey), g, nb))
+		self.expansions += expansions
+		return None
+
+class DistanceField(object):
+	'''
+	Breadth first search distances from source to every cell reachable through walkable tiles,
+	computed once so that reachability, distance and nearest target queries are just lookups.
+
+	The source itself does not need to be walkable. Pass the neighbour table of a PathFinder built
+	for the same map to skip rebuilding it.
+	'''
+	def __init__(self, grid, source, walkable, neighbours=None):
+		self.width = grid.width
+		self.height = grid.height
+		if neighbours is None:
+			neighbours = neighbour_table(grid)
+		h = self.height
+		n = self.width * h
+		cells = grid.cells
+		dist = array('i', [-1]) * n
+		start = source[0] * h + source[1]
+		dist[start] = 0
+		queue = deque([start])
+		popleft = queue.popleft
+		append = queue.append
+		while queue:
+			current = popleft()
+			d = dist[current] + 1
+			for nb in neighbours[current]:
+				if dist[nb] < 0 and walkable[cells[nb]]:
+					dist[nb] = d
+					append(nb)
+		self.source = source
+		self.dist = dist
+
+	def distance(self, position):
+		'''
+		Returns the number of steps from the source to position, or None if it cannot be reached.
+		'''
+		x, y = position
+		if not (0 <= x < self.width and 0 <= y < self.height):
+			return None
+		d = self.dist[x * self.height + y]
+		return d if d >= 0 else None
+
+	def reachable(self, position):
+		return self.distance(position) is not None
+
+	def touches(self, position):
+		'''
+		Returns True if position can be reached or is next to a cell that can be reached.
+		'''
+		x, y = position
+		for (nx, ny) in ((x, y), (x, y - 1), (x, y + 1), (x - 1, y), (x + 1, y)):
+			if self.distance((nx, ny)) is not None:
+				return True
+		return False
+
+	def nearest(self, targets):
+		'''
+		Returns (position, distance) of the closest reachable position in targets, or (None, None).
+		'''
+		best = None
+		bestdist = None
+		for position in targets:
+			d = self.distance(position)
+			if d is not None and (bestdist is None or d < bestdist):
+				best = position
+				bestdist = d
+		return (best, bestdist)
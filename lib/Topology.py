@@ -0,0 +1,46 @@
+from array import array
+
+from Grid import *
+from Pathing import neighbour_table
+
+# the directions rays are measured in, in the order blast_cells spreads a blast: up, down, left, right
+RAY_DIRECTIONS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+class Topology(object):
+	'''
+	Everything about a map that only depends on its walls, which never change during a game.
+	Build one in new_game and hand it to the per-turn computations (PathFinder, DistanceField,
+	DangerMap, blast_cells) so they look walls up in tables instead of reading them off the map.
+
+	neighbours: the neighbour_table of the map
+	rays: a tuple of one array('i') per direction of RAY_DIRECTIONS, holding for every cell index the
+		number of cells that can be stepped over in that direction before a wall or the edge of the map
+	steps: the change in cell index of a step in each direction of RAY_DIRECTIONS
+	'''
+	def __init__(self, grid):
+		w = grid.width
+		h = grid.height
+		n = w * h
+		cells = grid.cells
+
+		walls = bytearray(n)
+		for i in range(n):
+			if cells[i] == WALL:
+				walls[i] = 1
+		self.neighbours = neighbour_table(grid)
+		self.steps = tuple(dx * h + dy for (dx, dy) in RAY_DIRECTIONS)
+
+		rays = []
+		for (dx, dy) in RAY_DIRECTIONS:
+			ray = array('i', [0]) * n
+			# walk each line from the end the direction points to, so every cell extends the ray of the one ahead of it
+			xs = range(w - 1, -1, -1) if dx > 0 else range(w)
+			ys = range(h - 1, -1, -1) if dy > 0 else range(h)
+			for x in xs:
+				for y in ys:
+					nx = x + dx
+					ny = y + dy
+					if 0 <= nx < w and 0 <= ny < h and not walls[nx * h + ny]:
+						ray[x * h + y] = ray[nx * h + ny] + 1
+			rays.append(ray)
+		self.rays = tuple(rays)
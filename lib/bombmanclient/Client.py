@@ -1,7 +1,15 @@
 from SocketChannel import SocketChannel, SocketChannelFactory
 from BomberManProtocol_pb2 import *
+from Grid import Grid, ITEM_CODES
+from StateTracker import StateTracker
+from FastDecoder import scan_message
+from MessageView import MessageView
+from TurnRunner import TurnRunner
+from Instrumentation import TurnTimer
+from Replay import ReplayRecorder
+from ResponseCache import ResponseCache
+from google.protobuf.message import DecodeError
 import sys
-import datetime
 import traceback
 import logging
 import os
@@ -24,21 +32,64 @@ class BombmanClient():
    'STAYPUT': STAY_STILL
       }
 
-  def __init__(self):
-    self.channelFactory = SocketChannelFactory()
+  def __init__(self, fast_decode=True, channelFactory=None, turn_deadline=None, record_path=None, record_compress=False, reuse_messages=False):
+    '''
+    fast_decode: decode BomberManMessages with FastDecoder, falling back
+    to ParseFromString for messages it cannot handle.
+    channelFactory: the SocketChannelFactory used to connect, which holds
+    the socket options (TCP_NODELAY, buffer sizes, flush policy).
+    turn_deadline: if set, the AI runs on a worker thread and the client
+    answers after at most this many seconds with the best move the AI
+    published so far (see TurnRunner.py), or STAYPUT.
+    record_path: if set, every frame received is appended to this replay
+    file (see Replay.py), zlib compressed if record_compress is True.
+    reuse_messages: parse every turn into the same BomberManMessage in
+    protobuf reuse mode, so its containers and sub-messages are recycled
+    instead of allocated again. Views from parse_message are then built
+    right away, as the message is overwritten on the next turn.
+    '''
+    self.channelFactory = channelFactory if channelFactory is not None else SocketChannelFactory()
+    self.runner = TurnRunner(turn_deadline) if turn_deadline is not None else None
+    self.timer = TurnTimer()
+    self.recorder = ReplayRecorder(record_path, record_compress) if record_path is not None else None
+    self.fast_decode = fast_decode
+    self.tracker = StateTracker()
+    self.responses = ResponseCache()
+    self.message = None
+    if reuse_messages:
+      self.message = BomberManMessage()
+      self.message._SetReuse(True)
   
   def validateMessage(self, protobufMsg):
     '''
-    Check the protobuf message
+    Check the required fields of the protobuf message itself. The repeated
+    fields are parsed lazily, so their elements are checked by
+    validateElements when a get_* method reads them.
     '''
-    if not protobufMsg.IsInitialized():
+    for field in protobufMsg.DESCRIPTOR.fields:
+      if field.label == field.LABEL_REQUIRED and not protobufMsg.HasField(field.name):
+        raise Exception("Message is missing required fields")
+    if protobufMsg.HasField('mapSize') and not protobufMsg.mapSize.IsInitialized():
       raise Exception("Message is missing required fields")
 
-  # lists of lists which contains string of item on map
+  def validateElements(self, elements):
+    '''
+    Check the elements of a repeated field, parsing them. Returns the field.
+    '''
+    for element in elements:
+      if not element.IsInitialized():
+        raise Exception("Message is missing required fields")
+    return elements
+
+  # Grid of tile codes, gamemap[x][y] still returns the string of item on map
   def get_map_list(self, mapMessage, size):
-    gamemap = [range(size.y) for x in range(size.x)]    
+    gamemap = Grid(size.x, size.y)
+    cells = gamemap.cells
+    height = size.y
+    codes = ITEM_CODES
     for mapentry in mapMessage:
-        gamemap[mapentry.pos.x][mapentry.pos.y] = mapentry.mapItem
+      pos = mapentry.pos
+      cells[pos.x * height + pos.y] = codes[mapentry.mapItem]
     return gamemap
     
    # list of tuples of positions which has blocks
@@ -76,11 +127,112 @@ class BombmanClient():
       explosionlist.append((explosion.x, explosion.y))
     return explosionlist
 
+  def parse_message(self, data, end=None, reuse=True, timer=None):
+    '''
+    Decode a BomberManMessage through the reflective protobuf path.
+    The returned MessageView converts each field with its get_* method
+    the first time the field is read, unless the message is reused.
+    reuse: parse into self.message if the client reuses messages.
+    timer: the TurnTimer to mark the phases in, or None to leave them
+    untimed, e.g. when called from the AI thread.
+    '''
+    if not isinstance(data, str):
+      data = memoryview(data)[:end].tobytes()
+    elif end is not None:
+      data = data[:end]
+    msg = self.message if reuse and self.message is not None else BomberManMessage()
+    msg.ParseFromString(data)
+    if timer is not None:
+      timer.mark('ParseFromString')
+    self.validateMessage(msg)
+    if timer is not None:
+      timer.mark('validateMessage')
+    builders = {
+      'map_list': lambda: self.get_map_list(self.validateElements(msg.item), msg.mapSize),
+      'blocks': lambda: self.get_block_list(self.validateElements(msg.blocks)),
+      'bombs': lambda: self.get_bomb_list(self.validateElements(msg.bombs)),
+      'powerups': lambda: self.get_powerups(self.validateElements(msg.powerups)),
+      'bombers': lambda: self.get_player_position(self.validateElements(msg.players)),
+      'explosions': lambda: self.get_explosion_list(self.validateElements(msg.explosions))
+    }
+    view = MessageView(msg.messageType, msg.playerNum, msg.playerID, msg.responseID, builders)
+    if msg is self.message:
+      view.materialize()
+      if timer is not None:
+        self.mark_conversions(timer, view, 'materialize')
+    return view
+
+  def mark_conversions(self, timer, view, phase):
+    '''
+    Marks phase on timer, leaving out the fields view built during it,
+    which are recorded under their own phases instead.
+    '''
+    conversions = view.take_conversions()
+    timer.mark(phase, sum(seconds for (name, seconds) in conversions))
+    for (name, seconds) in conversions:
+      timer.record(name, seconds)
+
+  def decode_message(self, data, end=None):
+    '''
+    Decode a BomberManMessage held in data[:end] into a MessageView.
+    With fast_decode, a field FastDecoder cannot decode is taken from
+    the ParseFromString path instead.
+    '''
+    if self.fast_decode:
+      try:
+        view = scan_message(data, end)
+        frame = view.frame
+        # the fallback may run late on the AI thread, so it gets a message
+        # of its own and leaves the timer to the main loop
+        view.fallback = lambda: self.parse_message(frame, reuse=False)
+        self.timer.mark('fast decode')
+        return view
+      except DecodeError:
+        self.timer.mark('fast decode failed')
+        logging.debug("fast decoder rejected message, using ParseFromString", exc_info=True)
+    return self.parse_message(data, end, timer=self.timer)
+
+  def compute_move(self, msg, turn):
+    '''
+    Ask the AI for its move on the MOVE_REQUEST msg. turn is the
+    TurnRunner Turn the move is computed for, or None without a deadline.
+
+    With a deadline, an AI defining get_move_anytime is iterated and every
+    move it yields is published until the deadline cancels the turn.
+    Otherwise an AI defining get_move_view is handed the MessageView
+    itself, so the fields it never reads are never built.
+    '''
+    ai = self.ai
+    if turn is not None and hasattr(ai, 'get_move_anytime'):
+      move = None
+      for move in ai.get_move_anytime(msg.map_list, msg.bombs, msg.powerups, msg.bombers, msg.explosions, msg.playerNum, msg.responseID):
+        turn.publish(move)
+        if turn.cancelled:
+          break
+      return move
+    if hasattr(ai, 'get_move_view'):
+      return ai.get_move_view(msg)
+    if hasattr(ai, 'get_move_delta'):
+      delta = self.tracker.update(msg.map_list, msg.bombs, msg.powerups, msg.explosions)
+      return ai.get_move_delta(msg.map_list, msg.bombs, msg.powerups, msg.bombers, msg.explosions, msg.playerNum, msg.responseID, delta)
+    return ai.get_move(msg.map_list, msg.bombs, msg.powerups, msg.bombers, msg.explosions, msg.playerNum, msg.responseID)
+
   def runClient(self, ai, host='localhost', port=19999, playername="BombmanPlayer"):
     '''
     The main loop in which the client receive message
     and send response containing the number generated
     by the AI.
+
+    If the AI defines get_move_delta, it is called instead of get_move
+    with the same arguments plus a MoveDelta (see StateTracker.py)
+    describing what changed since the previous turn.
+
+    With a turn deadline, an AI defining get_move_anytime is asked for
+    moves through it instead, and an AI defining get_move_view is given
+    the MessageView of the turn (see compute_move).
+
+    Every phase of a turn is timed (see Instrumentation.py) and the
+    p50/p95/p99/max of each is logged at the end of every game.
     '''
     print "Starting client!!! My name is " + playername
     self.ai = ai
@@ -100,48 +252,61 @@ class BombmanClient():
     teamNameMessage.name = playername; 
     
     self.channel.write(teamNameMessage.SerializeToString())
+    self.channel.flush()
 
+    timer = self.timer
     while self.channel.connected:
-      msg = BomberManMessage()
-      msg.ParseFromString(self.channel.read())
-      self.validateMessage(msg)
+      timer.start()
+      length = self.channel.read_frame()
+      timer.mark('read')
+      if self.recorder is not None:
+        self.recorder.record(self.channel.buffer[:length])
+        timer.mark('record')
+      msg = self.decode_message(self.channel.buffer, length)
 
       if msg.messageType == START_GAME:
-        maplist=self.get_map_list(msg.item, msg.mapSize)
+        # only AIs taking deltas need the tracker, see compute_move
+        if hasattr(self.ai, 'get_move_delta'):
+          self.tracker.reset(msg.map_list)
         try:
-          self.ai.new_game(self.get_map_list(msg.item, msg.mapSize), self.get_block_list(msg.blocks), self.get_player_position(msg.players), msg.playerNum)
+          self.ai.new_game(msg.map_list, msg.blocks, msg.bombers, msg.playerNum)
         except:
           logging.exception("Unexpected error at new_game: ")
           break
 
+        timer.cancel()
         continue
       if msg.messageType == MOVE_REQUEST:
-        starttime = datetime.datetime.now()
         try:
-          move = ai.get_move(self.get_map_list(msg.item, msg.mapSize), self.get_bomb_list(msg.bombs), self.get_powerups(msg.powerups), self.get_player_position(msg.players), self.get_explosion_list(msg.explosions), msg.playerNum, msg.responseID)
+          if self.runner is not None:
+            move = self.runner.run(lambda turn: self.compute_move(msg, turn), 'STAYPUT')
+          else:
+            move = self.compute_move(msg, None)
         except:
           move = STAY_STILL
           logging.exception("Unexpected error during turn {0}:".format(msg.responseID))
           break
+        self.mark_conversions(timer, msg, 'get_move')
 
-        wrapperMessage = ClientWrapperMessage()
-        wrapperMessage.messageType = MOVE_RESPONSE
-        wrapperMessage.moveResponse.PlayerID = msg.playerID
-        wrapperMessage.moveResponse.playerNum = msg.playerNum
-        wrapperMessage.moveResponse.responseID = msg.responseID
-        if move in self.PlayerMoves: 
-          wrapperMessage.moveResponse.response.move = self.PlayerMoves[move]
-        else: 
-          wrapperMessage.moveResponse.response.move = STAY_STILL
-
-        self.channel.write(wrapperMessage.SerializeToString())
-        diff = datetime.datetime.now() - starttime
-        logging.info("message sent for move {0}: took {1} milliseconds".format(msg.responseID, diff.microseconds/1000))
+        response = self.responses.serialize(msg.playerID, msg.playerNum, self.PlayerMoves.get(move, STAY_STILL), msg.responseID)
+        timer.mark('build response')
+        self.channel.write(response)
+        self.channel.flush()
+        timer.mark('write')
+        took = timer.end()
+        logging.info("message sent for move {0}: took {1:.3f} milliseconds".format(msg.responseID, took * 1000))
         continue
       if msg.messageType == END_GAME:
+        timer.cancel()
+        logging.info("turn timings for this game:\n" + timer.report())
+        timer.reset()
+        if self.recorder is not None:
+          self.recorder.flush()
         self.channel.close()
         continue
 
+    if self.recorder is not None:
+      self.recorder.close()
     self.channel.close()
     
     
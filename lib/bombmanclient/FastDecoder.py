@@ -0,0 +1,282 @@
+'''
+A decoder specialized for the nettyserver.protocol BomberManMessage.
+
+It walks the wire bytes once and builds the structures handed to the AI
+(Grid, bomb dictionary, powerup dictionary, ...) directly, instead of going
+through python_message and its per-field decoder closures and then copying
+the message tree into dictionaries.
+
+Anything it does not expect (groups, repeated singular sub-messages,
+missing required fields, unknown map items, ...) raises DecodeError so the
+caller can fall back to the reflective ParseFromString path, which is the
+reference behaviour.
+
+scan_message only reads the scalar fields and where each sub-message lies;
+the sub-messages are decoded when the AI first reads the MessageView field
+built from them.
+'''
+from google.protobuf.message import DecodeError
+from Grid import Grid, ITEM_CODES
+from MessageView import MessageView
+
+# wire types
+_VARINT = 0
+_FIXED64 = 1
+_LENGTH_DELIMITED = 2
+_FIXED32 = 5
+
+_MASK32 = (1 << 32) - 1
+
+def _varint(buf, pos):
+  b = buf[pos]
+  pos += 1
+  if b < 0x80:
+    return (b, pos)
+  result = b & 0x7f
+  shift = 7
+  while 1:
+    b = buf[pos]
+    pos += 1
+    result |= (b & 0x7f) << shift
+    if b < 0x80:
+      return (result, pos)
+    shift += 7
+    if shift >= 64:
+      raise DecodeError('Too many bytes when decoding varint.')
+
+def _int32(buf, pos):
+  '''
+  Decodes an int32 varint the same way decoder._DecodeSignedVarint32 does.
+  '''
+  b = buf[pos]
+  if b < 0x80:
+    return (b, pos + 1)
+  (value, pos) = _varint(buf, pos)
+  if value > 0x7fffffffffffffff:
+    value -= (1 << 64)
+    value |= ~_MASK32
+  else:
+    value &= _MASK32
+  return (value, pos)
+
+def _length(buf, pos, end):
+  (size, pos) = _varint(buf, pos)
+  if pos + size > end:
+    raise DecodeError('Truncated message.')
+  return (pos + size, pos)
+
+def _skip(buf, pos, end, tag):
+  wire_type = tag & 7
+  if wire_type == _VARINT:
+    (value, pos) = _varint(buf, pos)
+  elif wire_type == _LENGTH_DELIMITED:
+    (pos, start) = _length(buf, pos, end)
+  elif wire_type == _FIXED64:
+    pos += 8
+  elif wire_type == _FIXED32:
+    pos += 4
+  else:
+    raise DecodeError('Unsupported wire type {0}.'.format(wire_type))
+  if pos > end:
+    raise DecodeError('Truncated message.')
+  return pos
+
+def _tag(buf, pos):
+  b = buf[pos]
+  if b < 0x80:
+    return (b, pos + 1)
+  return _varint(buf, pos)
+
+def _position(buf, pos, end):
+  x = None
+  y = None
+  while pos < end:
+    (tag, pos) = _tag(buf, pos)
+    if tag == 0x08:
+      (x, pos) = _int32(buf, pos)
+    elif tag == 0x10:
+      (y, pos) = _int32(buf, pos)
+    else:
+      pos = _skip(buf, pos, end, tag)
+  if pos != end:
+    raise DecodeError('Truncated message.')
+  if x is None or y is None:
+    raise DecodeError('Position is missing required fields.')
+  return (x, y)
+
+def _sub_position(buf, pos, end, current):
+  '''
+  Decodes a singular Position field. A second occurrence would have to be
+  merged into the first, which only the reflective path does.
+  '''
+  if current is not None:
+    raise DecodeError('Repeated singular message field.')
+  (subend, pos) = _length(buf, pos, end)
+  return (_position(buf, pos, subend), subend)
+
+def _string(buf, pos, end):
+  (subend, pos) = _length(buf, pos, end)
+  return (bytes(buf[pos:subend]), subend)
+
+def _map_entry(buf, pos, end):
+  position = None
+  item = None
+  while pos < end:
+    (tag, pos) = _tag(buf, pos)
+    if tag == 0x0a:
+      (position, pos) = _sub_position(buf, pos, end, position)
+    elif tag == 0x12:
+      (item, pos) = _string(buf, pos, end)
+    else:
+      pos = _skip(buf, pos, end, tag)
+  if position is None or item is None:
+    raise DecodeError('MapEntry is missing required fields.')
+  try:
+    return (position, ITEM_CODES[item])
+  except KeyError:
+    raise DecodeError('Unknown map item {0!r}.'.format(item))
+
+def _bomb(buf, pos, end):
+  position = None
+  brange = None
+  time_left = None
+  owner = None
+  while pos < end:
+    (tag, pos) = _tag(buf, pos)
+    if tag == 0x0a:
+      (position, pos) = _sub_position(buf, pos, end, position)
+    elif tag == 0x10:
+      (brange, pos) = _int32(buf, pos)
+    elif tag == 0x18:
+      (time_left, pos) = _int32(buf, pos)
+    elif tag == 0x20:
+      (owner, pos) = _int32(buf, pos)
+    else:
+      pos = _skip(buf, pos, end, tag)
+  if position is None or brange is None or time_left is None or owner is None:
+    raise DecodeError('BombMessage is missing required fields.')
+  return (position, {'owner':owner, 'range':brange, 'time_left':time_left})
+
+def _powerup(buf, pos, end):
+  position = None
+  ptype = None
+  while pos < end:
+    (tag, pos) = _tag(buf, pos)
+    if tag == 0x0a:
+      (position, pos) = _sub_position(buf, pos, end, position)
+    elif tag == 0x12:
+      (ptype, pos) = _string(buf, pos, end)
+    else:
+      pos = _skip(buf, pos, end, tag)
+  if position is None or ptype is None:
+    raise DecodeError('PowerUp is missing required fields.')
+  return (position, ptype.decode('utf-8'))
+
+def _player(buf, pos, end):
+  position = None
+  number = None
+  bombs_left = 0
+  bomb_range = 0
+  while pos < end:
+    (tag, pos) = _tag(buf, pos)
+    if tag == 0x0a:
+      (position, pos) = _sub_position(buf, pos, end, position)
+    elif tag == 0x10:
+      (number, pos) = _int32(buf, pos)
+    elif tag == 0x18:
+      (bombs_left, pos) = _int32(buf, pos)
+    elif tag == 0x20:
+      (bomb_range, pos) = _int32(buf, pos)
+    else:
+      pos = _skip(buf, pos, end, tag)
+  if position is None or number is None:
+    raise DecodeError('PlayerMessage is missing required fields.')
+  return (number, {'position':position, 'bomb_range':bomb_range, 'bomb_count':bombs_left})
+
+def _spans(buf, spans, decode):
+  # IndexError means a sub-message claims to run past the buffer
+  try:
+    return [decode(buf, pos, end) for (pos, end) in spans]
+  except IndexError:
+    raise DecodeError('Truncated message.')
+
+def _map(buf, size_spans, item_spans):
+  if len(size_spans) > 1:
+    raise DecodeError('Repeated singular message field.')
+  map_size = _spans(buf, size_spans, _position)
+  (width, height) = map_size[0] if map_size else (0, 0)
+  gamemap = Grid(width, height)
+  cells = gamemap.cells
+  try:
+    for ((x, y), code) in _spans(buf, item_spans, _map_entry):
+      cells[x * height + y] = code
+  except IndexError:
+    raise DecodeError('Map entry outside of the map.')
+  return gamemap
+
+def scan_message(data, end=None):
+  '''
+  Reads a serialized BomberManMessage into a MessageView without decoding
+  its sub-messages. data[:end] is copied once, so the view stays valid
+  after the buffer it came from is reused; the copy is kept as the view's
+  frame.
+
+  Raises DecodeError if the top level of the message is malformed or is
+  missing required fields; the view raises DecodeError for a field whose
+  sub-messages are malformed when that field is read.
+  '''
+  buf = bytearray(memoryview(data)[:end])
+  end = len(buf)
+  pos = 0
+  messageType = None
+  playerNum = None
+  playerID = None
+  responseID = None
+  # tag -> list of (start, end) of every sub-message with that tag
+  spans = {0x2a:[], 0x32:[], 0x3a:[], 0x42:[], 0x4a:[], 0x52:[], 0x5a:[]}
+  try:
+    while pos < end:
+      (tag, pos) = _tag(buf, pos)
+      if tag == 0x08:
+        (messageType, pos) = _int32(buf, pos)
+      elif tag == 0x10:
+        (playerNum, pos) = _int32(buf, pos)
+      elif tag == 0x1a:
+        (playerID, pos) = _string(buf, pos, end)
+        playerID = playerID.decode('utf-8')
+      elif tag == 0x20:
+        (responseID, pos) = _int32(buf, pos)
+      elif tag in spans:
+        (subend, pos) = _length(buf, pos, end)
+        spans[tag].append((pos, subend))
+        pos = subend
+      else:
+        pos = _skip(buf, pos, end, tag)
+  except IndexError:
+    raise DecodeError('Truncated message.')
+  if pos != end:
+    raise DecodeError('Truncated message.')
+  if messageType is None or playerNum is None or playerID is None or responseID is None:
+    raise DecodeError('BomberManMessage is missing required fields.')
+
+  builders = {
+    'map_list': lambda: _map(buf, spans[0x32], spans[0x3a]),
+    'blocks': lambda: _spans(buf, spans[0x5a], _position),
+    'bombs': lambda: dict(_spans(buf, spans[0x42], _bomb)),
+    'powerups': lambda: dict(_spans(buf, spans[0x4a], _powerup)),
+    'bombers': lambda: dict(_spans(buf, spans[0x2a], _player)),
+    'explosions': lambda: _spans(buf, spans[0x52], _position)
+  }
+  view = MessageView(messageType, playerNum, playerID, responseID, builders)
+  view.frame = buf
+  return view
+
+def decode_message(data, end=None):
+  '''
+  Decodes a serialized BomberManMessage held in data[:end] into a
+  MessageView with every field built.
+
+  Raises DecodeError if the message is malformed, is missing required fields
+  or uses anything this decoder does not handle.
+  '''
+  return scan_message(data, end).materialize()
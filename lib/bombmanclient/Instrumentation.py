@@ -0,0 +1,171 @@
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+
+# clock id of CLOCK_MONOTONIC in the Linux <time.h>
+_CLOCK_MONOTONIC = 1
+
+class _timespec(ctypes.Structure):
+  _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+def _monotonic_clock():
+  '''
+  Returns a function reading a clock that never steps back, in seconds:
+  time.monotonic on Python 3, clock_gettime(CLOCK_MONOTONIC) through
+  ctypes on Linux, and the wall clock elsewhere.
+  '''
+  if hasattr(time, 'monotonic'):
+    return time.monotonic
+  if not sys.platform.startswith('linux'):
+    return time.time
+  try:
+    # clock_gettime is in libc since glibc 2.17, in librt before
+    library = ctypes.CDLL(ctypes.util.find_library('rt') or ctypes.util.find_library('c'), use_errno=True)
+    clock_gettime = library.clock_gettime
+  except (OSError, AttributeError):
+    return time.time
+  clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_timespec)]
+  def monotonic():
+    # a timespec per call, the clock is read from the AI thread too
+    ts = _timespec()
+    if clock_gettime(_CLOCK_MONOTONIC, ctypes.byref(ts)) != 0:
+      errno = ctypes.get_errno()
+      raise OSError(errno, os.strerror(errno))
+    return ts.tv_sec + ts.tv_nsec * 1e-9
+  return monotonic
+
+clock = _monotonic_clock()
+
+class Histogram():
+  '''
+  A latency histogram in the style of HdrHistogram: values are counted in
+  buckets whose width doubles with every power of two, each split into
+  sub_buckets linear steps, so every recorded value is kept to within
+  1/sub_buckets of its true value whatever its magnitude.
+
+  Values are recorded in seconds and stored as whole microseconds.
+  '''
+  def __init__(self, sub_buckets=32):
+    self.sub_buckets = sub_buckets
+    self.reset()
+
+  def reset(self):
+    self.counts = {}
+    self.count = 0
+    self.max = 0.0
+    self.total = 0.0
+
+  def bucket(self, micros):
+    if micros < self.sub_buckets:
+      return (0, micros)
+    magnitude = micros.bit_length() - self.sub_buckets.bit_length()
+    return (magnitude + 1, micros >> magnitude)
+
+  def value(self, bucket):
+    '''
+    The lower bound, in microseconds, of the values in bucket.
+    '''
+    (magnitude, sub) = bucket
+    return sub << (magnitude - 1) if magnitude > 0 else sub
+
+  def record(self, seconds):
+    micros = int(seconds * 1e6)
+    key = self.bucket(micros)
+    self.counts[key] = self.counts.get(key, 0) + 1
+    self.count += 1
+    self.total += seconds
+    if seconds > self.max:
+      self.max = seconds
+
+  def percentile(self, fraction):
+    '''
+    Returns the value in seconds below which fraction of the recorded values fall.
+    '''
+    if self.count == 0:
+      return 0.0
+    wanted = fraction * self.count
+    seen = 0
+    for key in sorted(self.counts):
+      seen += self.counts[key]
+      if seen >= wanted:
+        return self.value(key) / 1e6
+    return self.max
+
+class TurnTimer():
+  '''
+  Times the phases of every turn into one Histogram per phase.
+
+  Call start() when a turn begins and mark(phase) at the end of each
+  phase; the time since the previous mark (or start) is recorded under
+  that phase name. end() records the time since start() under 'turn',
+  leaving out the phases listed in idle (time spent waiting for the
+  server is not part of the turn budget).
+  '''
+  def __init__(self, idle=('read',)):
+    self.idle = idle
+    self.histograms = {}
+    self.order = []
+    self.started = None
+    self.last = None
+    self.idle_time = 0.0
+
+  def start(self):
+    self.started = self.last = clock()
+    self.idle_time = 0.0
+
+  def mark(self, phase, excluded=0.0):
+    '''
+    Records the time since the previous mark under phase, less excluded
+    seconds spent on work recorded under phases of its own.
+    '''
+    if self.last is None:
+      return
+    now = clock()
+    elapsed = now - self.last - excluded
+    self.last = now
+    if phase in self.idle:
+      self.idle_time += elapsed
+    self.record(phase, elapsed)
+
+  def end(self):
+    '''
+    Records and returns the duration of the turn in seconds.
+    '''
+    if self.started is None:
+      return 0.0
+    elapsed = clock() - self.started - self.idle_time
+    self.record('turn', elapsed)
+    self.started = self.last = None
+    return elapsed
+
+  def cancel(self):
+    '''
+    Forget the current turn without recording a total, e.g. for messages other than MOVE_REQUEST.
+    '''
+    self.started = self.last = None
+
+  def record(self, phase, seconds):
+    if seconds < 0:
+      # only the wall clock fallback steps back
+      return
+    if phase not in self.histograms:
+      self.histograms[phase] = Histogram()
+      self.order.append(phase)
+    self.histograms[phase].record(seconds)
+
+  def report(self):
+    '''
+    Returns a line per phase with its p50/p95/p99/max in milliseconds.
+    '''
+    lines = []
+    for phase in self.order:
+      h = self.histograms[phase]
+      lines.append("{0:>20}: n={1} p50={2:.3f} p95={3:.3f} p99={4:.3f} max={5:.3f} ms".format(
+        phase, h.count, h.percentile(0.5) * 1000, h.percentile(0.95) * 1000, h.percentile(0.99) * 1000, h.max * 1000))
+    return '\n'.join(lines)
+
+  def reset(self):
+    self.histograms = {}
+    self.order = []
@@ -0,0 +1,91 @@
+'''
+The view of a BomberManMessage handed to the AI.
+'''
+from google.protobuf.message import DecodeError
+from Instrumentation import clock
+import logging
+
+# the fields of a MessageView that are only built when first read
+LAZY_FIELDS = ('map_list', 'blocks', 'bombs', 'powerups', 'bombers', 'explosions')
+
+# the TurnTimer phase the building of each lazy field is timed under
+CONVERSION_PHASES = {
+  'map_list': 'get_map_list',
+  'blocks': 'get_block_list',
+  'bombs': 'get_bomb_list',
+  'powerups': 'get_powerups',
+  'bombers': 'get_player_position',
+  'explosions': 'get_explosion_list'
+}
+
+class MessageView(object):
+  '''
+  A BomberManMessage converted to the structures the AI works with.
+
+  messageType, playerNum, playerID, responseID: as in the protobuf message
+  map_list: Grid of the map
+  blocks: list of tuples of positions which have blocks
+  bombs: dictionary { position : {'owner', 'range', 'time_left'} }
+  powerups: dictionary { position : type }
+  bombers: dictionary { playernumber : {'position', 'bomb_range', 'bomb_count'} }
+  explosions: list of tuples of positions which have explosions
+
+  The fields in LAZY_FIELDS are built by builders[name]() the first time
+  they are read and then kept, so an AI that never looks at the powerups
+  never pays for converting them. A view is meant to last one turn.
+
+  fallback: if set, called (once) when a builder raises DecodeError; it
+  must return another view of the same message whose field is used instead.
+  frame: the serialized message the view was read from, if kept.
+  conversions: list of (CONVERSION_PHASES name, seconds) for every field
+  built so far. Fields may be built on the AI thread, so the view only
+  appends to it and the main loop moves them into its TurnTimer (see
+  take_conversions).
+  '''
+  def __init__(self, messageType, playerNum, playerID, responseID, builders, fallback=None):
+    self.messageType = messageType
+    self.playerNum = playerNum
+    self.playerID = playerID
+    self.responseID = responseID
+    self.builders = builders
+    self.fallback = fallback
+    self.reference = None
+    self.frame = None
+    self.conversions = []
+    self.taken = 0
+
+  def __getattr__(self, name):
+    # only called for attributes not set yet, so a built field costs nothing to read again
+    if name not in LAZY_FIELDS:
+      raise AttributeError(name)
+    started = clock()
+    try:
+      value = self.builders[name]()
+    except DecodeError:
+      if self.fallback is None:
+        raise
+      if self.reference is None:
+        logging.debug("could not build {0}, using the fallback decoder".format(name), exc_info=True)
+        self.reference = self.fallback()
+      value = getattr(self.reference, name)
+    self.conversions.append((CONVERSION_PHASES[name], clock() - started))
+    setattr(self, name, value)
+    return value
+
+  def materialize(self):
+    '''
+    Builds every field that has not been read yet. Returns the view.
+    '''
+    for name in LAZY_FIELDS:
+      getattr(self, name)
+    return self
+
+  def take_conversions(self):
+    '''
+    Returns the conversions recorded since the last call.
+    '''
+    # list appends are atomic, so reading up to a length taken first is safe against the AI thread
+    end = len(self.conversions)
+    taken = self.conversions[self.taken:end]
+    self.taken = end
+    return taken
@@ -0,0 +1,79 @@
+'''
+Replay files hold the raw BomberManMessage frames a client received, so a
+game can be fed through the decoding and AI pipeline again without a server.
+
+A replay file starts with MAGIC followed by one record per frame: the frame
+length as 4 bytes in Big Endian, with the top bit set if the frame is
+zlib compressed, then the (possibly compressed) frame.
+'''
+import mmap
+import os
+import struct
+import zlib
+
+MAGIC = b'BMREPLAY1'
+
+COMPRESSED = 0x80000000
+
+class ReplayRecorder():
+  '''
+  Appends frames to a replay file, creating it if needed.
+
+  compress: zlib compress every frame, worthwhile for full map frames
+  '''
+  def __init__(self, path, compress=False):
+    self.compress = compress
+    new = not os.path.exists(path) or os.path.getsize(path) == 0
+    self.file = open(path, 'ab')
+    if new:
+      self.file.write(MAGIC)
+
+  def record(self, frame):
+    frame = bytes(frame)
+    length = len(frame)
+    if self.compress:
+      frame = zlib.compress(frame)
+      length = len(frame) | COMPRESSED
+    self.file.write(struct.pack('>L', length))
+    self.file.write(frame)
+
+  def flush(self):
+    self.file.flush()
+
+  def close(self):
+    self.file.close()
+
+class ReplayReader():
+  '''
+  Iterates over the frames of a replay file. The file is memory mapped and
+  frames are only read (and decompressed) as the iteration reaches them,
+  so replays of any size can be streamed.
+  '''
+  def __init__(self, path):
+    self.path = path
+
+  def __iter__(self):
+    size = os.path.getsize(self.path)
+    if size < len(MAGIC):
+      raise ValueError("{0} is not a replay file".format(self.path))
+    f = open(self.path, 'rb')
+    try:
+      data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+      try:
+        if data[:len(MAGIC)] != MAGIC:
+          raise ValueError("{0} is not a replay file".format(self.path))
+        pos = len(MAGIC)
+        while pos + 4 <= size:
+          length = struct.unpack_from('>L', data, pos)[0]
+          pos += 4
+          compressed = length & COMPRESSED
+          length &= ~COMPRESSED
+          if pos + length > size:
+            raise ValueError("{0} ends in the middle of a frame".format(self.path))
+          frame = data[pos:pos + length]
+          pos += length
+          yield zlib.decompress(frame) if compressed else frame
+      finally:
+        data.close()
+    finally:
+      f.close()
@@ -0,0 +1,60 @@
+'''
+Serialized MOVE_RESPONSE messages without building a ClientWrapperMessage
+every turn.
+
+Within a game a client only ever sends ten different MOVE_RESPONSEs apart
+from the responseID. responseID is the last field of MoveResponse, and
+moveResponse the last field of ClientWrapperMessage, so everything before
+it can be serialized once per (PlayerID, playerNum, move). Only the
+responseID and the moveResponse length in front of it are written per
+turn.
+'''
+from BomberManProtocol_pb2 import *
+from google.protobuf.internal import encoder
+from google.protobuf.internal import wire_format
+
+_MOVE_RESPONSE_TAG = encoder.TagBytes(ClientWrapperMessage.DESCRIPTOR.fields_by_name['moveResponse'].number, wire_format.WIRETYPE_LENGTH_DELIMITED)
+_RESPONSE_ID_TAG = encoder.TagBytes(MoveResponse.DESCRIPTOR.fields_by_name['responseID'].number, wire_format.WIRETYPE_VARINT)
+
+class ResponseCache():
+  '''
+  templates: dictionary { (PlayerID, playerNum, move) : (bytes before the
+  moveResponse length, MoveResponse bytes before responseID) }
+  '''
+  def __init__(self):
+    self.templates = {}
+
+  def template(self, playerID, playerNum, move):
+    key = (playerID, playerNum, move)
+    template = self.templates.get(key)
+    if template is None:
+      wrapper = ClientWrapperMessage()
+      wrapper.messageType = MOVE_RESPONSE
+      wrapper.moveResponse.PlayerID = playerID
+      wrapper.moveResponse.playerNum = playerNum
+      wrapper.moveResponse.response.move = move
+      # responseID is left out, it is added for every turn
+      head = wrapper.SerializePartialToString()
+      body = wrapper.moveResponse.SerializePartialToString()
+      # drop the moveResponse tag and length, they depend on the responseID
+      prefix = head[:len(head) - len(body) - len(_MOVE_RESPONSE_TAG) - len(encoder._VarintBytes(len(body)))]
+      template = (prefix, body)
+      self.templates[key] = template
+    return template
+
+  def serialize(self, playerID, playerNum, move, responseID):
+    '''
+    Returns the serialized ClientWrapperMessage answering turn responseID with move (a Moves value).
+    '''
+    if responseID < 0:
+      # negative int32s take ten bytes, not worth a special case
+      wrapper = ClientWrapperMessage()
+      wrapper.messageType = MOVE_RESPONSE
+      wrapper.moveResponse.PlayerID = playerID
+      wrapper.moveResponse.playerNum = playerNum
+      wrapper.moveResponse.response.move = move
+      wrapper.moveResponse.responseID = responseID
+      return wrapper.SerializeToString()
+    (prefix, body) = self.template(playerID, playerNum, move)
+    responseBytes = _RESPONSE_ID_TAG + encoder._VarintBytes(responseID)
+    return prefix + _MOVE_RESPONSE_TAG + encoder._VarintBytes(len(body) + len(responseBytes)) + body + responseBytes
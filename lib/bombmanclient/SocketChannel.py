@@ -1,15 +1,35 @@
 import socket
 import struct
 
+# flush policies
+FLUSH_IMMEDIATE = 'immediate' # every write goes out right away
+FLUSH_MANUAL = 'manual' # writes are queued until flush() is called
+
 class SocketChannelFactory():
   '''
   Provides method to create channel connection.
+
+  nodelay: set TCP_NODELAY so small frames are not held back by Nagle's algorithm
+  sndbuf, rcvbuf: socket send/receive buffer sizes in bytes, None keeps the system default
+  flush_policy: FLUSH_IMMEDIATE or FLUSH_MANUAL, see SocketChannel
   '''
+  def __init__(self, nodelay=True, sndbuf=None, rcvbuf=None, flush_policy=FLUSH_IMMEDIATE):
+    self.nodelay = nodelay
+    self.sndbuf = sndbuf
+    self.rcvbuf = rcvbuf
+    self.flush_policy = flush_policy
+
   def openChannel(self, host, port):
     try:
       sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+      if self.nodelay:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+      if self.sndbuf is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf)
+      if self.rcvbuf is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
       sock.connect((host, port))
-      return SocketChannel(sock)
+      return SocketChannel(sock, flush_policy=self.flush_policy)
     except socket.error: 
       print "Cannot connect to {0} at port {1}. Please make sure the server is running.".format(host, port)
       raise
@@ -19,10 +39,21 @@ class SocketChannel():
   SocketChannel provides an abstraction layer above the 
   underlying socket, which sends and receives messages framed
   by their length as 4 bytes in Big Endian.
+
+  Incoming frames are read with recv_into into a single reusable
+  bytearray which grows to fit the largest frame seen.
+
+  Outgoing frames are sent with a single scatter/gather sendmsg call
+  where the platform has it. With FLUSH_MANUAL, writes are queued
+  and sent together by flush().
   '''
-  def __init__(self, sock):
+  def __init__(self, sock, buffer_size=65536, flush_policy=FLUSH_IMMEDIATE):
     self.sock = sock
     self.connected = True
+    self.buffer = bytearray(buffer_size)
+    self.view = memoryview(self.buffer)
+    self.flush_policy = flush_policy
+    self.pending = []
   
   def write(self, byteStream):
     '''
@@ -30,37 +61,92 @@ class SocketChannel():
     The message will be prepended by its length packed
     in 4 bytes in Big Endian.
     '''
-    streamLen = struct.pack('>L', len(byteStream))
-    framedStream = streamLen + byteStream
+    self.pending.append(struct.pack('>L', len(byteStream)))
+    self.pending.append(byteStream)
+    if self.flush_policy == FLUSH_IMMEDIATE:
+      self.flush()
+
+  def flush(self):
+    '''
+    Send every queued frame.
+
+    Where the socket has sendmsg (Python 3.3 and later) the frames go out
+    in one gathering call without being joined. Python 2 sockets have no
+    sendmsg, so there they are joined into one string and sent with
+    sendall, which costs the same as writing them together did before:
+    the gain of a flush is fewer send calls, not fewer copies.
+    '''
+    if not self.pending:
+      return
+    parts = self.pending
+    self.pending = []
     try:
-      self.sock.sendall(framedStream)
+      if hasattr(self.sock, 'sendmsg'):
+        sent = self.sock.sendmsg(parts)
+        total = sum(len(part) for part in parts)
+        if sent < total:
+          self.sock.sendall(b''.join(parts)[sent:])
+      else:
+        self.sock.sendall(b''.join(parts))
     except socket.error:
       self.close()
       raise Exception("socket send fail, close")
       
+  def read_frame(self):
+    '''
+    Read a message prepended by its length in 4 bytes in Big Endian
+    from channel into self.buffer and return its length.
+    The message occupies self.buffer[:length] until the next read.
+    '''
+    self.readinto(self.view, 4)
+    length = struct.unpack_from('>L', self.buffer)[0]
+    if length > len(self.buffer):
+      self.buffer = bytearray(max(length, 2 * len(self.buffer)))
+      self.view = memoryview(self.buffer)
+    self.readinto(self.view, length)
+    return length
+
+  def read_view(self):
+    '''
+    Read a message and return a memoryview of it without copying.
+    The view is only valid until the next read.
+    '''
+    length = self.read_frame()
+    return self.view[:length]
+
   def read(self):
     '''
     Read a byte stream message prepended by its length
     in 4 bytes in Big Endian from channel.
     The message content is returned.
     '''
-    lenField = self.readnbytes(4)
-    length = struct.unpack('>L', lenField)[0]
-    byteStream = self.readnbytes(length)
-    return byteStream
+    length = self.read_frame()
+    return bytes(self.buffer[:length])
   
-  def readnbytes(self, n):
-    buf = ''
-    while n > 0:
-      data = self.sock.recv(n)
-      if data == '':
+  def readinto(self, view, n):
+    '''
+    Fill the first n bytes of view from the socket.
+    '''
+    if n == 0:
+      # recv_into takes a size of 0 to mean the whole view
+      return
+    got = self.sock.recv_into(view, n)
+    while got < n:
+      if got == 0:
+        raise Exception("socket broken or connection closed")
+      count = self.sock.recv_into(view[got:], n - got)
+      if count == 0:
         raise Exception("socket broken or connection closed")
-      buf += data
-      n -= len(data)
-    return buf
+      got += count
+
+  def readnbytes(self, n):
+    buf = bytearray(n)
+    self.readinto(memoryview(buf), n)
+    return bytes(buf)
 
   def close(self):
     print("closing connection")
+    self.pending = []
     self.sock.close()
     self.connected = False
     
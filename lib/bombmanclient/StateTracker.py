@@ -0,0 +1,84 @@
+class MoveDelta():
+  '''
+  What changed on the board since the previous MOVE_REQUEST.
+
+  full: True if there was no previous turn to compare against (first turn of a game),
+        in which case the change fields are empty and the whole board should be scanned.
+  changed_cells: list of (x, y, old_code, new_code) for every map cell whose tile code changed
+  bombs_added: dictionary { position : bomb } of bombs that were not there last turn
+  bombs_ticked: dictionary { position : bomb } of bombs that were there last turn and still are
+  bombs_removed: dictionary { position : bomb } of last turn's bombs which are gone (exploded)
+  powerups_added: dictionary { position : type } of powerups uncovered since last turn
+  powerups_removed: dictionary { position : type } of powerups picked up or destroyed
+  explosions: set of positions exploding this turn
+  '''
+  def __init__(self, full=False):
+    self.full = full
+    self.changed_cells = []
+    self.bombs_added = {}
+    self.bombs_ticked = {}
+    self.bombs_removed = {}
+    self.powerups_added = {}
+    self.powerups_removed = {}
+    self.explosions = set()
+
+class StateTracker():
+  '''
+  Keeps a private copy of the previous turn's board and computes a MoveDelta
+  against every new turn. The copies are taken before the AI sees the
+  structures, so AIs are free to modify what they are given.
+  '''
+  def __init__(self):
+    self.reset()
+
+  def reset(self, gamemap=None):
+    '''
+    Forget the previous turn. Called at the start of every game, optionally
+    with the starting map so the first MOVE_REQUEST already gets a real delta.
+    '''
+    self.gamemap = gamemap.copy() if gamemap is not None else None
+    self.bombs = {}
+    self.powerups = {}
+
+  def update(self, gamemap, bombs, powerups, explosions):
+    '''
+    Returns the MoveDelta between the stored turn and this one and
+    stores this turn for the next call.
+    '''
+    previous = self.gamemap
+    delta = MoveDelta(full=previous is None or previous.width != gamemap.width or previous.height != gamemap.height)
+
+    if not delta.full and previous.cells != gamemap.cells:
+      old = previous.cells
+      new = gamemap.cells
+      height = gamemap.height
+      changed = delta.changed_cells
+      for i in xrange(len(new)):
+        if old[i] != new[i]:
+          changed.append((i // height, i % height, old[i], new[i]))
+
+    if not delta.full:
+      oldbombs = self.bombs
+      for pos in bombs:
+        if pos in oldbombs:
+          delta.bombs_ticked[pos] = bombs[pos]
+        else:
+          delta.bombs_added[pos] = bombs[pos]
+      for pos in oldbombs:
+        if pos not in bombs:
+          delta.bombs_removed[pos] = oldbombs[pos]
+
+      oldpowerups = self.powerups
+      for pos in powerups:
+        if pos not in oldpowerups:
+          delta.powerups_added[pos] = powerups[pos]
+      for pos in oldpowerups:
+        if pos not in powerups:
+          delta.powerups_removed[pos] = oldpowerups[pos]
+
+    delta.explosions.update(explosions)
+
+    self.gamemap = gamemap.copy()
+    self.bombs = dict((pos, dict(bombs[pos])) for pos in bombs)
+    self.powerups = dict(powerups)
+    return delta
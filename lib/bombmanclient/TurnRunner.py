@@ -0,0 +1,119 @@
+import sys
+import os
+import errno
+import select
+import threading
+import logging
+import Queue
+from Instrumentation import clock
+
+class Turn():
+  '''
+  The state of one move computation, shared between the client loop
+  and the thread computing the move.
+
+  best: the best move published so far, sent if the deadline hits
+  cancelled: set once the deadline has passed, computations should check
+             it and stop since their result will not be used any more
+  '''
+  def __init__(self, default):
+    self.best = default
+    self.cancelled = False
+    self.result = None
+    self.error = None
+    self.done = threading.Event()
+
+  def publish(self, move):
+    '''
+    Record move as the best move found so far.
+    '''
+    self.best = move
+
+class TurnRunner():
+  '''
+  Runs move computations on a worker thread so a slow AI cannot make
+  the client miss a turn. run() waits at most deadline seconds for the
+  computation and then returns the best move published so far.
+
+  One worker thread, started on the first turn, runs every computation.
+  It writes a byte to a pipe when one is finished and run() waits on the
+  pipe with select, which wakes up as soon as the byte arrives; on Python
+  2 Event.wait with a timeout polls with sleeps of up to 50 ms instead.
+
+  Only one computation runs at a time. If the previous turn's computation
+  is still going when a new turn starts (it ignored Turn.cancelled), the
+  new turn is answered with the default move without starting another.
+  '''
+  def __init__(self, deadline):
+    self.deadline = deadline
+    self.current = None
+    self.jobs = Queue.Queue()
+    self.worker = None
+    (self.finished_read, self.finished_write) = os.pipe()
+
+  def busy(self):
+    return self.current is not None and not self.current.done.is_set()
+
+  def run(self, compute, default):
+    '''
+    compute: a function taking the Turn and returning the move
+    default: the move to send if nothing better was published in time
+
+    Exceptions raised by compute before the deadline are re-raised here.
+    '''
+    if self.busy():
+      logging.warning("previous move computation still running, sending default move")
+      return default
+    # bytes left by turns that finished after their deadline
+    self._drain()
+    turn = Turn(default)
+    self.current = turn
+    if self.worker is None:
+      self.worker = threading.Thread(target=self._work)
+      self.worker.daemon = True
+      self.worker.start()
+    self.jobs.put((compute, turn))
+    if not self._wait(self.deadline):
+      turn.cancelled = True
+      logging.warning("move computation missed the {0} second deadline".format(self.deadline))
+      return turn.best
+    if turn.error is not None:
+      raise turn.error[0], turn.error[1], turn.error[2]
+    return turn.result if turn.result is not None else turn.best
+
+  def _wait(self, timeout):
+    '''
+    Waits at most timeout seconds for the worker to finish the current
+    computation. Returns True if it did.
+    '''
+    end = clock() + timeout
+    while True:
+      remaining = end - clock()
+      if remaining <= 0:
+        return False
+      try:
+        (readable, writable, failed) = select.select([self.finished_read], [], [], remaining)
+      except select.error, e:
+        if e.args[0] == errno.EINTR:
+          continue
+        raise
+      if readable:
+        os.read(self.finished_read, 1)
+        return True
+
+  def _drain(self):
+    while select.select([self.finished_read], [], [], 0)[0]:
+      os.read(self.finished_read, 4096)
+
+  def _work(self):
+    while True:
+      (compute, turn) = self.jobs.get()
+      try:
+        turn.result = compute(turn)
+      except:
+        turn.error = sys.exc_info()
+      finally:
+        # the byte is written before done is set, so once busy() is
+        # False _drain() is sure to find it
+        os.write(self.finished_write, b'x')
+        turn.done.set()
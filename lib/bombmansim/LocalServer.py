@@ -0,0 +1,261 @@
+'''
+A pure Python stand-in for the bombman.jar server, speaking the same
+BomberManProtocol over the same 4-byte big endian framing.
+
+It accepts the clients, reads their NAME_RESPONSE, sends START_GAME, then
+one MOVE_REQUEST per turn, waits up to the turn deadline for each
+MOVE_RESPONSE and finally sends END_GAME. Games are played on the
+Simulator engine, or a list of recorded MOVE_REQUEST frames is replayed
+verbatim to a single client, which makes it a load generator for
+measuring client round trip latency.
+'''
+import select
+import socket
+import struct
+import time
+
+from bombmanclient.BomberManProtocol_pb2 import *
+from bombmanclient.SocketChannel import SocketChannel
+from Simulator import Game
+from Messages import make_message
+from Tournament import load_ai, percentile
+
+# Moves -> action string, the reverse of BombmanClient.PlayerMoves
+ACTION_NAMES = {
+	MOVE_DOWN: 'MOVEDOWN',
+	MOVE_UP: 'MOVEUP',
+	MOVE_LEFT: 'MOVELEFT',
+	MOVE_RIGHT: 'MOVERIGHT',
+	PLACE_BOMB: 'PLACEBOMB',
+	PLACE_BOMB_MOVE_LEFT: 'BOMBANDMOVELEFT',
+	PLACE_BOMB_MOVE_RIGHT: 'BOMBANDMOVERIGHT',
+	PLACE_BOMB_MOVE_UP: 'BOMBANDMOVEUP',
+	PLACE_BOMB_MOVE_DOWN: 'BOMBANDMOVEDOWN',
+	STAY_STILL: 'STAYPUT'
+}
+
+class Connection():
+	'''
+	A connected client.
+
+	sent_at: the time the last frame was handed to the socket, after it was built and serialized
+	incoming: bytes received by poll() that do not make a whole frame yet
+	'''
+	def __init__(self, channel):
+		self.channel = channel
+		self.name = None
+		self.sent_at = None
+		self.incoming = bytearray()
+
+	def send(self, msg):
+		self.send_frame(msg.SerializeToString())
+
+	def send_frame(self, frame):
+		# taken before the write: a client running in the same process can get through its
+		# whole turn before this thread has the interpreter back from the send
+		self.sent_at = time.time()
+		self.channel.write(frame)
+
+	def receive(self):
+		'''
+		Blocks until a whole message has arrived and returns it.
+		'''
+		msg = ClientWrapperMessage()
+		msg.ParseFromString(self.channel.read())
+		return msg
+
+	def poll(self):
+		'''
+		Reads what has arrived, without blocking if the socket is readable, and returns
+		the list of messages completed by it. Raises an Exception if the client is gone.
+		'''
+		data = self.channel.sock.recv(65536)
+		if not data:
+			raise Exception("socket broken or connection closed")
+		self.incoming.extend(data)
+		messages = []
+		while len(self.incoming) >= 4:
+			length = struct.unpack_from('>L', self.incoming)[0]
+			if len(self.incoming) < 4 + length:
+				break
+			msg = ClientWrapperMessage()
+			msg.ParseFromString(bytes(self.incoming[4:4 + length]))
+			del self.incoming[:4 + length]
+			messages.append(msg)
+		return messages
+
+class LocalServer():
+	'''
+	host, port: where to listen for clients
+	clients: how many players connect over the network (1 or 2)
+	opponent: the 'module:Class' spec of the in-process AI playing the second player when clients is 1,
+		None to have it stay still
+	deadline: seconds a client has to answer a MOVE_REQUEST before STAYPUT is assumed
+	turn_interval: minimum seconds between two MOVE_REQUESTs, 0 to go as fast as the clients answer
+	game_options: passed to every simulator Game
+
+	latencies: the round trip time of every MOVE_RESPONSE received in time, in seconds
+	missed: the number of MOVE_REQUESTs not answered before the deadline
+	'''
+	def __init__(self, host='localhost', port=19999, clients=2, opponent=None, deadline=1.0, turn_interval=0.0, **game_options):
+		self.host = host
+		self.port = port
+		self.clients = clients
+		self.opponent = opponent
+		self.deadline = deadline
+		self.turn_interval = turn_interval
+		self.game_options = game_options
+		self.latencies = []
+		self.missed = 0
+		self.listener = None
+
+	def listen(self):
+		self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.listener.bind((self.host, self.port))
+		self.listener.listen(self.clients)
+		# port 0 asks the system for a free port
+		self.port = self.listener.getsockname()[1]
+
+	def accept(self):
+		'''
+		Waits for every client to connect and send its NAME_RESPONSE.
+		'''
+		connections = []
+		while len(connections) < self.clients:
+			(sock, address) = self.listener.accept()
+			sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+			connection = Connection(SocketChannel(sock))
+			msg = connection.receive()
+			if msg.messageType != NAME_RESPONSE:
+				connection.channel.close()
+				continue
+			connection.name = msg.name
+			connections.append(connection)
+		return connections
+
+	def collect(self, connections, response_id):
+		'''
+		Returns { connection index : action } for the MOVE_RESPONSEs to response_id that arrive before
+		the deadline, counted for every connection from the time its MOVE_REQUEST went out, as is the
+		round trip. Late answers to earlier requests are dropped.
+		'''
+		actions = {}
+		waiting = dict((connection.channel.sock, index) for (index, connection) in enumerate(connections) if connection.channel.connected)
+		while waiting:
+			now = time.time()
+			for sock in list(waiting):
+				if connections[waiting[sock]].sent_at + self.deadline <= now:
+					self.missed += 1
+					del waiting[sock]
+			if not waiting:
+				break
+			remaining = min(connections[index].sent_at for index in waiting.values()) + self.deadline - now
+			(readable, writable, errors) = select.select(list(waiting), [], [], remaining)
+			for sock in readable:
+				index = waiting[sock]
+				connection = connections[index]
+				# only the bytes that have arrived are read, a frame arriving in pieces does not block
+				try:
+					messages = connection.poll()
+				except Exception:
+					connection.channel.close()
+					del waiting[sock]
+					continue
+				for msg in messages:
+					if msg.messageType != MOVE_RESPONSE or msg.moveResponse.responseID != response_id:
+						continue
+					self.latencies.append(time.time() - connection.sent_at)
+					actions[index] = ACTION_NAMES.get(msg.moveResponse.response.move, 'STAYPUT')
+					del waiting[sock]
+					break
+		return actions
+
+	def message(self, game, message_type, player_index, name):
+		return make_message(game.grid.to_list(), message_type, game.bombs, game.powerups, game.bombers, game.explosions,
+			player_index, game.turn, name)
+
+	def play_game(self, connections):
+		'''
+		Plays one simulator game with connections and returns the GameResult.
+		'''
+		game = Game(**self.game_options)
+		ai = None
+		if len(connections) < 2 and self.opponent is not None:
+			ai = load_ai(self.opponent)
+			view = game.view(1)
+			ai.new_game(view[0], game.blocks(), view[3], 1)
+
+		for (index, connection) in enumerate(connections):
+			connection.send(self.message(game, START_GAME, index, connection.name))
+
+		while not game.finished() and any(c.channel.connected for c in connections):
+			turn_start = time.time()
+			for (index, connection) in enumerate(connections):
+				if connection.channel.connected:
+					connection.send(self.message(game, MOVE_REQUEST, index, connection.name))
+			actions = self.collect(connections, game.turn)
+			moves = [actions.get(index, 'STAYPUT') for index in range(len(connections))]
+			if len(moves) < 2:
+				moves.append(ai.get_move(*game.view(1)) if ai is not None else 'STAYPUT')
+			game.step(moves)
+			wait = self.turn_interval - (time.time() - turn_start)
+			if wait > 0:
+				time.sleep(wait)
+
+		for (index, connection) in enumerate(connections):
+			if connection.channel.connected:
+				connection.send(self.message(game, END_GAME, index, connection.name))
+		return game
+
+	def replay(self, connection, frames):
+		'''
+		Sends recorded frames to connection one after the other, waiting for the answer
+		to every MOVE_REQUEST before sending the next frame. If the recording does not
+		start with START_GAME, one is made from the first MOVE_REQUEST, and the game is
+		ended after the last frame if the recording does not do it.
+		'''
+		started = False
+		msg = None
+		for frame in frames:
+			msg = BomberManMessage()
+			msg.ParseFromString(frame)
+			if msg.messageType == START_GAME:
+				started = True
+			elif msg.messageType == MOVE_REQUEST and not started:
+				start = BomberManMessage()
+				start.CopyFrom(msg)
+				start.messageType = START_GAME
+				connection.send(start)
+				started = True
+			connection.send_frame(frame)
+			if msg.messageType == MOVE_REQUEST:
+				self.collect([connection], msg.responseID)
+			if not connection.channel.connected:
+				return
+		if msg is not None and msg.messageType != END_GAME:
+			msg.messageType = END_GAME
+			connection.send(msg)
+
+	def serve(self, games=1, frames=None):
+		'''
+		Plays games games, accepting a new set of clients for each one (clients close
+		their connection on END_GAME). With frames, every game replays them instead.
+		'''
+		if self.listener is None:
+			self.listen()
+		for number in range(games):
+			connections = self.accept()
+			if frames is not None:
+				self.replay(connections[0], frames)
+			else:
+				self.play_game(connections)
+			for connection in connections:
+				if connection.channel.connected:
+					connection.channel.close()
+
+	def report(self):
+		times = self.latencies
+		return "{0} responses, {1} missed, round trip p50 {2:.2f} ms p95 {3:.2f} ms p99 {4:.2f} ms max {5:.2f} ms".format(
+			len(times), self.missed, percentile(times, 0.5) * 1000, percentile(times, 0.95) * 1000,
+			percentile(times, 0.99) * 1000, max(times or [0]) * 1000)
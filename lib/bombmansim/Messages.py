@@ -0,0 +1,60 @@
+'''
+Builds BomberManMessages from the structures the client hands to the AI,
+the reverse of what BombmanClient does with a message.
+'''
+from bombmanclient.BomberManProtocol_pb2 import *
+from Enums import *
+
+def make_message(board, message_type=MOVE_REQUEST, bombs={}, powerups={}, players=None, explosions=[], player_num=0, response_id=1, player_id=None):
+	'''
+	Builds a BomberManMessage describing board. bombs, powerups and players
+	use the same dictionaries the client hands to the AI.
+	Every BLOCK on the board is also listed in the message's blocks.
+	'''
+	width = len(board)
+	height = len(board[0])
+	if players is None:
+		players = {
+			0: {'position': (1, 1), 'bomb_range': 1, 'bomb_count': 1},
+			1: {'position': (width - 2, height - 2), 'bomb_range': 1, 'bomb_count': 1}
+		}
+	msg = BomberManMessage()
+	msg.messageType = message_type
+	msg.playerNum = player_num
+	msg.playerID = player_id if player_id is not None else 'player{0}'.format(player_num)
+	msg.responseID = response_id
+	msg.mapSize.x = width
+	msg.mapSize.y = height
+	for number in players:
+		player = msg.players.add()
+		player.pos.x, player.pos.y = players[number]['position']
+		player.playerNumber = number
+		player.bombsLeft = players[number]['bomb_count']
+		player.bombRange = players[number]['bomb_range']
+	for x in range(width):
+		for y in range(height):
+			entry = msg.item.add()
+			entry.pos.x = x
+			entry.pos.y = y
+			entry.mapItem = board[x][y]
+			if board[x][y] == Enums.MapItems.BLOCK:
+				block = msg.blocks.add()
+				block.x = x
+				block.y = y
+	for (x, y) in bombs:
+		bomb = msg.bombs.add()
+		bomb.pos.x = x
+		bomb.pos.y = y
+		bomb.range = bombs[(x, y)]['range']
+		bomb.timeLeft = bombs[(x, y)]['time_left']
+		bomb.owner = bombs[(x, y)]['owner']
+	for (x, y) in powerups:
+		powerup = msg.powerups.add()
+		powerup.pos.x = x
+		powerup.pos.y = y
+		powerup.type = powerups[(x, y)]
+	for (x, y) in explosions:
+		explosion = msg.explosions.add()
+		explosion.x = x
+		explosion.y = y
+	return msg
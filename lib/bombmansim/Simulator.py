@@ -0,0 +1,249 @@
+'''
+An in-process bombman game engine for running games offline, without the
+Java server or sockets.
+
+The rules follow what the client sees from bombman.jar: bombs get a 16 turn
+fuse and the owner's current range, blasts spread in the four directions and
+are stopped by walls and blocks (see DangerMap.blast_cells), bombs caught in a
+blast explode with it, destroyed blocks may leave a FIREUP or BOMBUP behind,
+and a bomber standing in an explosion dies.
+'''
+import random
+import time
+import traceback
+
+from Enums import *
+from Direction import *
+from Grid import *
+from DangerMap import blast_cells
+from Topology import Topology
+
+BOMB_FUSE = 16
+
+# tiles a bomber can walk onto
+WALKABLE_CODES = code_table([BLANK, POWERUP, EXPLOSION])
+
+# action -> (places a bomb, Direction moved in)
+ACTIONS = {}
+for direction in Directions.values():
+	ACTIONS[direction.action] = (False, direction)
+	ACTIONS[direction.bombaction] = (True, direction)
+
+def make_board(width=17, height=17, block_density=0.6, rng=random):
+	'''
+	Returns a list of lists of MapItem names laid out like the bombman maps:
+	walls around the border and on every cell with two even coordinates,
+	blocks scattered on the rest except next to the starting corners.
+	'''
+	board = []
+	corners = [(1, 1), (2, 1), (1, 2), (width - 2, height - 2), (width - 3, height - 2), (width - 2, height - 3)]
+	for x in range(width):
+		column = []
+		for y in range(height):
+			if x == 0 or y == 0 or x == width - 1 or y == height - 1 or (x % 2 == 0 and y % 2 == 0):
+				column.append(Enums.MapItems.WALL)
+			elif (x, y) not in corners and rng.random() < block_density:
+				column.append(Enums.MapItems.BLOCK)
+			else:
+				column.append(Enums.MapItems.BLANK)
+		board.append(column)
+	return board
+
+class GameResult():
+	'''
+	The outcome of a game.
+
+	winner: the index of the winning player, or None for a draw
+	turns: the number of turns played
+	alive: list of booleans, whether each player survived
+	move_times: list of lists, the seconds each player's get_move took on every turn
+	errors: list of the number of exceptions each player's AI raised
+	'''
+	def __init__(self, winner, turns, alive, move_times, errors):
+		self.winner = winner
+		self.turns = turns
+		self.alive = alive
+		self.move_times = move_times
+		self.errors = errors
+
+class Game():
+	'''
+	The state of one game between two players.
+
+	board: a list of lists of MapItem names to start from, generated with make_board if None
+	seed: seeds the random number generator used for the board and powerups
+	max_turns: the game is a draw if both bombers are still alive after this many turns
+	powerup_chance: the chance a destroyed block leaves a powerup behind
+	'''
+	def __init__(self, board=None, width=17, height=17, block_density=0.6, seed=None, max_turns=500, powerup_chance=0.3):
+		self.rng = random.Random(seed)
+		if board is None:
+			board = make_board(width, height, block_density, self.rng)
+		self.grid = Grid.from_list(board)
+		self.topology = Topology(self.grid)
+		self.max_turns = max_turns
+		self.powerup_chance = powerup_chance
+		w = self.grid.width
+		h = self.grid.height
+		self.bombers = {
+			0: {'position': (1, 1), 'bomb_range': 1, 'bomb_count': 1},
+			1: {'position': (w - 2, h - 2), 'bomb_range': 1, 'bomb_count': 1}
+		}
+		self.alive = [True, True]
+		self.bombs = {}
+		self.powerups = {}
+		# powerups left by destroyed blocks, shown once the explosion clears
+		self.uncovered = {}
+		self.explosions = []
+		self.turn = 0
+
+	def blocks(self):
+		'''
+		Returns a list of the positions of all blocks.
+		'''
+		h = self.grid.height
+		return [(i // h, i % h) for (i, code) in enumerate(self.grid.cells) if code == BLOCK]
+
+	def view(self, player_index):
+		'''
+		Returns the arguments to get_move for player_index. Everything is a copy, so AIs may modify it.
+		'''
+		bombs = dict((position, dict(self.bombs[position])) for position in self.bombs)
+		bombers = dict((index, dict(self.bombers[index])) for index in self.bombers)
+		return (self.grid.copy(), bombs, dict(self.powerups), bombers, list(self.explosions), player_index, self.turn)
+
+	def finished(self):
+		return not all(self.alive) or self.turn >= self.max_turns
+
+	def winner(self):
+		if self.alive[0] and not self.alive[1]:
+			return 0
+		if self.alive[1] and not self.alive[0]:
+			return 1
+		return None
+
+	def step(self, actions):
+		'''
+		Plays one turn. actions is a list of the action string of each player.
+		'''
+		grid = self.grid
+		self.turn += 1
+
+		# last turn's explosions are gone
+		for (x, y) in self.explosions:
+			if grid.get(x, y) == EXPLOSION:
+				grid.set(x, y, BLANK)
+		self.explosions = []
+		for (x, y) in self.uncovered:
+			self.powerups[(x, y)] = self.uncovered[(x, y)]
+			grid.set(x, y, POWERUP)
+		self.uncovered = {}
+
+		# bombs are placed where the bombers stand, then everyone moves
+		moves = []
+		for index in range(len(actions)):
+			(bomb, direction) = ACTIONS.get(actions[index], (False, STILL))
+			bomber = self.bombers[index]
+			position = bomber['position']
+			if bomb and self.alive[index] and bomber['bomb_count'] > 0 and position not in self.bombs:
+				self.bombs[position] = {'owner': index, 'range': bomber['bomb_range'], 'time_left': BOMB_FUSE}
+				bomber['bomb_count'] -= 1
+				grid.set(position[0], position[1], BOMB)
+			moves.append(direction)
+		for index in range(len(moves)):
+			if not self.alive[index]:
+				continue
+			bomber = self.bombers[index]
+			(x, y) = bomber['position']
+			nx = x + moves[index].dx
+			ny = y + moves[index].dy
+			if (nx, ny) != (x, y) and WALKABLE_CODES[grid.get(nx, ny)]:
+				bomber['position'] = (nx, ny)
+				self.pick_up(bomber, (nx, ny))
+
+		self.tick_bombs()
+
+		for index in self.bombers:
+			if self.bombers[index]['position'] in self.explosions:
+				self.alive[index] = False
+
+	def pick_up(self, bomber, position):
+		if position not in self.powerups:
+			return
+		if self.powerups.pop(position) == Enums.PowerUps.FIREUP:
+			bomber['bomb_range'] += 1
+		else:
+			bomber['bomb_count'] += 1
+		self.grid.set(position[0], position[1], BLANK)
+
+	def tick_bombs(self):
+		'''
+		Counts every fuse down and explodes the bombs that run out, along with any bomb caught in their blast.
+		'''
+		grid = self.grid
+		h = grid.height
+		exploding = []
+		for position in self.bombs:
+			self.bombs[position]['time_left'] -= 1
+			if self.bombs[position]['time_left'] <= 0:
+				exploding.append(position)
+
+		hit = set()
+		destroyed = set()
+		while exploding:
+			position = exploding.pop()
+			if position not in self.bombs:
+				continue
+			bomb = self.bombs.pop(position)
+			self.bombers[bomb['owner']]['bomb_count'] += 1
+			for (i, distance) in blast_cells(grid, position, bomb['range'], self.topology):
+				cell = (i // h, i % h)
+				hit.add(cell)
+				if grid.cells[i] == BLOCK:
+					destroyed.add(cell)
+				if cell in self.bombs:
+					exploding.append(cell)
+
+		for (x, y) in hit:
+			self.powerups.pop((x, y), None)
+			grid.set(x, y, EXPLOSION)
+		self.explosions = sorted(hit)
+
+		# blocks leave their powerup behind once the explosion clears
+		for (x, y) in sorted(destroyed):
+			if self.rng.random() < self.powerup_chance:
+				self.uncovered[(x, y)] = self.rng.choice([Enums.PowerUps.FIREUP, Enums.PowerUps.BOMBUP])
+
+	def play(self, ais):
+		'''
+		Plays the game to the end with ais, a list of two objects with the PlayerAI interface.
+		Returns a GameResult.
+		'''
+		move_times = [[] for ai in ais]
+		errors = [0 for ai in ais]
+		blocks = self.blocks()
+		for index in range(len(ais)):
+			view = self.view(index)
+			ais[index].new_game(view[0], blocks[:], view[3], index)
+
+		while not self.finished():
+			actions = []
+			for index in range(len(ais)):
+				start = time.time()
+				try:
+					action = ais[index].get_move(*self.view(index))
+				except Exception:
+					traceback.print_exc()
+					errors[index] += 1
+					action = STILL.action
+				move_times[index].append(time.time() - start)
+				actions.append(action)
+			self.step(actions)
+
+		return GameResult(self.winner(), self.turn, list(self.alive), move_times, errors)
+
+def play_game(ais, **kwargs):
+	'''
+	Plays one game between ais and returns the GameResult. kwargs are passed to Game.
+	'''
+	return Game(**kwargs).play(ais)
@@ -0,0 +1,118 @@
+'''
+Runs many independent simulator games in parallel across CPU cores and
+aggregates the results.
+
+AIs are named by import path strings such as 'bombmanplayer.PlayerAI:PlayerAI'
+so worker processes can build their own instances. The two entrants are
+labelled 'A' and 'B' so an AI can play against itself.
+'''
+import multiprocessing
+import time
+
+from Simulator import Game
+
+def load_ai(spec):
+	'''
+	Returns a new instance of the AI class named by spec ('module:ClassName').
+	'''
+	module_name, class_name = spec.split(':')
+	module = __import__(module_name, fromlist=[class_name])
+	return getattr(module, class_name)()
+
+def play_match(task):
+	'''
+	Plays one game. task is (game number, [(label, ai spec) of player 0, (label, ai spec) of player 1], Game kwargs).
+	Returns a summary dictionary which is cheap to send back from a worker process.
+	'''
+	(number, entrants, game_options) = task
+	options = dict(game_options)
+	options['seed'] = (options.get('seed') or 0) + number
+	start = time.time()
+	result = Game(**options).play([load_ai(spec) for (label, spec) in entrants])
+	return {
+		'labels': [label for (label, spec) in entrants],
+		'winner': None if result.winner is None else entrants[result.winner][0],
+		'turns': result.turns,
+		'move_times': dict(enumerate(result.move_times)),
+		'errors': result.errors,
+		'seconds': time.time() - start
+	}
+
+def percentile(values, fraction):
+	if not values:
+		return 0.0
+	values = sorted(values)
+	return values[min(len(values) - 1, int(fraction * len(values)))]
+
+class TournamentResult():
+	'''
+	Totals over all games, keyed by entrant label ('A' or 'B').
+
+	specs: dictionary { label : ai spec }
+	wins: dictionary { label : games won }
+	draws: the number of drawn games
+	games: the number of games played
+	move_times: dictionary { label : list of the seconds every get_move call took }
+	errors: dictionary { label : exceptions raised }
+	seconds: wall clock time of the whole tournament
+	'''
+	def __init__(self, specs):
+		self.specs = specs
+		self.wins = dict((label, 0) for label in specs)
+		self.draws = 0
+		self.games = 0
+		self.turns = 0
+		self.move_times = dict((label, []) for label in specs)
+		self.errors = dict((label, 0) for label in specs)
+		self.seconds = 0.0
+
+	def add(self, summary):
+		self.games += 1
+		self.turns += summary['turns']
+		if summary['winner'] is None:
+			self.draws += 1
+		else:
+			self.wins[summary['winner']] += 1
+		for index in summary['move_times']:
+			label = summary['labels'][index]
+			self.move_times[label].extend(summary['move_times'][index])
+			self.errors[label] += summary['errors'][index]
+
+	def report(self):
+		lines = ["{0} games, {1} draws, {2:.1f} s, {3:.1f} games/s".format(self.games, self.draws, self.seconds, self.games / max(self.seconds, 1e-9))]
+		for label in sorted(self.wins):
+			times = self.move_times[label]
+			lines.append("  {0} {1}: {2} wins, {3} errors, get_move p50 {4:.2f} ms p95 {5:.2f} ms max {6:.2f} ms".format(
+				label, self.specs[label], self.wins[label], self.errors[label],
+				percentile(times, 0.5) * 1000, percentile(times, 0.95) * 1000, max(times or [0]) * 1000))
+		return '\n'.join(lines)
+
+def run_tournament(ai_a, ai_b, games, processes=None, swap_sides=True, **game_options):
+	'''
+	Plays games between the AIs named by ai_a and ai_b on a pool of processes
+	(one per core by default) and returns a TournamentResult.
+
+	swap_sides: alternate which AI starts as player 0, so neither profits from its corner
+	game_options: passed to every Game; game n is seeded with seed + n, counting a seed of None as 0
+	'''
+	tasks = []
+	for number in range(games):
+		entrants = [('B', ai_b), ('A', ai_a)] if swap_sides and number % 2 else [('A', ai_a), ('B', ai_b)]
+		tasks.append((number, entrants, game_options))
+
+	result = TournamentResult({'A': ai_a, 'B': ai_b})
+	start = time.time()
+	if processes == 1:
+		summaries = map(play_match, tasks)
+	else:
+		pool = multiprocessing.Pool(processes)
+		try:
+			chunksize = max(1, games // (4 * (processes or multiprocessing.cpu_count())))
+			summaries = list(pool.imap_unordered(play_match, tasks, chunksize))
+		finally:
+			pool.close()
+			pool.join()
+	for summary in summaries:
+		result.add(summary)
+	result.seconds = time.time() - start
+	return result
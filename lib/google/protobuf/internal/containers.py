@@ -41,6 +41,10 @@ are:
 
 __author__ = 'petar@google.com (Petar Petrov)'
 
+import struct
+
+from google.protobuf import message
+
 
 class BaseContainer(object):
 
@@ -106,6 +110,10 @@ class RepeatedScalarFieldContainer(BaseContainer):
     super(RepeatedScalarFieldContainer, self).__init__(message_listener)
     self._type_checker = type_checker
 
+  def _Recycle(self):
+    """Empties the container for reuse, keeping its list."""
+    del self._values[:]
+
   def append(self, value):
     """Appends an item to the list. Similar to list.append()."""
     self._type_checker.CheckValue(value)
@@ -186,10 +194,21 @@ class RepeatedScalarFieldContainer(BaseContainer):
 
 class RepeatedCompositeFieldContainer(BaseContainer):
 
-  """Simple, list-like container for holding repeated composite fields."""
+  """Simple, list-like container for holding repeated composite fields.
+
+  Elements read by the parser are kept as offsets into the serialized buffer
+  and only parsed into message objects when they are first accessed (see
+  _AddLazy()).  Until then their slot in _values holds None.
+
+  Parse errors in an element are deferred accordingly: ParseFromString()
+  accepts a message with a malformed repeated sub-message, and accessing
+  that element raises DecodeError, as do ByteSize(), ==, and
+  SerializeToString() on the message.  IsInitialized() returns False for
+  it instead, and FindInitializationErrors() reports the element.
+  """
 
   # Disallows assignment to other attributes.
-  __slots__ = ['_message_descriptor']
+  __slots__ = ['_message_descriptor', '_buffer', '_offsets', '_spare']
 
   def __init__(self, message_listener, message_descriptor):
     """
@@ -208,14 +227,118 @@ class RepeatedCompositeFieldContainer(BaseContainer):
     """
     super(RepeatedCompositeFieldContainer, self).__init__(message_listener)
     self._message_descriptor = message_descriptor
+    # The buffer unparsed elements live in, and for every element either the
+    # (start, end) of its encoding in that buffer or None once it is parsed.
+    self._buffer = None
+    self._offsets = None
+    # None, or when the parent message is in reuse mode the cleared elements
+    # _NewElement() hands out before allocating new ones.
+    self._spare = None
+
+  def _NewElement(self):
+    """Returns an empty element listening to this container."""
+    spare = self._spare
+    if spare:
+      return spare.pop()
+    new_element = self._message_descriptor._concrete_class()
+    if spare is not None:
+      new_element._recycled = {}
+    new_element._SetListener(self._message_listener)
+    return new_element
+
+  def _Recycle(self):
+    """Empties the container, keeping the elements parsed so far for
+    _NewElement().
+    """
+    spare = self._spare
+    if spare is None:
+      spare = self._spare = []
+    for element in self._values:
+      if element is not None:
+        element._Recycle()
+        spare.append(element)
+    self._values = []
+    self._buffer = None
+    self._offsets = None
+
+  def _AddLazy(self, buffer, pos, end):
+    """Appends an element whose encoding is buffer[pos:end], without parsing
+    it.  Used by the decoder; the element is parsed on first access.
+    """
+    if self._offsets is None:
+      self._buffer = buffer
+      self._offsets = [None] * len(self._values)
+    elif buffer is not self._buffer:
+      # Only one buffer is referenced, so parse what is left of the old one.
+      self._MaterializeAll()
+      self._buffer = buffer
+      self._offsets = [None] * len(self._values)
+    self._offsets.append((pos, end))
+    self._values.append(None)
+
+  def _Materialize(self, index):
+    """Parses the element at index, which must not have been parsed yet."""
+    (pos, end) = self._offsets[index]
+    new_element = self._NewElement()
+    try:
+      if new_element._InternalParse(self._buffer, pos, end) != end:
+        # The only reason _InternalParse would return early is if it
+        # encountered an end-group tag.
+        raise message.DecodeError('Unexpected end-group tag.')
+    except IndexError:
+      raise message.DecodeError('Truncated message.')
+    except struct.error, e:
+      raise message.DecodeError(e)
+    self._values[index] = new_element
+    self._offsets[index] = None
+    return new_element
+
+  def _MaterializeAll(self):
+    """Parses every element not parsed yet and drops the buffer."""
+    if self._offsets is None:
+      return
+    offsets = self._offsets
+    for index in xrange(len(offsets)):
+      if offsets[index] is not None:
+        self._Materialize(index)
+    self._buffer = None
+    self._offsets = None
+
+  def __getitem__(self, key):
+    """Retrieves item by the specified key, parsing it if needed."""
+    if self._offsets is None:
+      return self._values[key]
+    if isinstance(key, slice):
+      self._MaterializeAll()
+      return self._values[key]
+    value = self._values[key]
+    if value is None:
+      if key < 0:
+        key += len(self._values)
+      value = self._Materialize(key)
+    return value
+
+  def __repr__(self):
+    self._MaterializeAll()
+    return repr(self._values)
+
+  def sort(self, *args, **kwargs):
+    self._MaterializeAll()
+    super(RepeatedCompositeFieldContainer, self).sort(*args, **kwargs)
 
   def add(self, **kwargs):
     """Adds a new element at the end of the list and returns it. Keyword
     arguments may be used to initialize the element.
     """
-    new_element = self._message_descriptor._concrete_class(**kwargs)
-    new_element._SetListener(self._message_listener)
+    if kwargs:
+      new_element = self._message_descriptor._concrete_class(**kwargs)
+      new_element._SetListener(self._message_listener)
+    else:
+      new_element = self._NewElement()
     self._values.append(new_element)
+    if self._offsets is not None:
+      # keep _offsets in step with _values for later _AddLazy() calls
+      self._offsets.append(None)
     if not self._message_listener.dirty:
       self._message_listener.Modified()
     return new_element
@@ -232,30 +355,37 @@ class RepeatedCompositeFieldContainer(BaseContainer):
       new_element._SetListener(listener)
       new_element.MergeFrom(message)
       values.append(new_element)
+      if self._offsets is not None:
+        self._offsets.append(None)
     listener.Modified()
 
   def MergeFrom(self, other):
     """Appends the contents of another repeated field of the same type to this
     one, copying each individual message.
     """
+    other._MaterializeAll()
     self.extend(other._values)
 
   def remove(self, elem):
     """Removes an item from the list. Similar to list.remove()."""
+    self._MaterializeAll()
     self._values.remove(elem)
     self._message_listener.Modified()
 
   def __getslice__(self, start, stop):
     """Retrieves the subset of items from between the specified indices."""
+    self._MaterializeAll()
     return self._values[start:stop]
 
   def __delitem__(self, key):
     """Deletes the item at the specified position."""
+    self._MaterializeAll()
     del self._values[key]
     self._message_listener.Modified()
 
   def __delslice__(self, start, stop):
     """Deletes the subset of items from between the specified indices."""
+    self._MaterializeAll()
     del self._values[start:stop]
     self._message_listener.Modified()
 
@@ -266,4 +396,6 @@ class RepeatedCompositeFieldContainer(BaseContainer):
     if not isinstance(other, self.__class__):
       raise TypeError('Can only compare repeated composite fields against '
                       'other repeated composite fields.')
+    self._MaterializeAll()
+    other._MaterializeAll()
     return self._values == other._values
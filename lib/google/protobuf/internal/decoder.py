@@ -80,6 +80,7 @@ we repeatedly read a tag, look up the corresponding decoder, and invoke it.
 
 __author__ = 'kenton@google.com (Kenton Varda)'
 
+import re
 import struct
 from google.protobuf.internal import encoder
 from google.protobuf.internal import wire_format
@@ -110,8 +111,17 @@ def _VarintDecoder(mask):
 
   local_ord = ord
   def DecodeVarint(buffer, pos):
-    result = 0
-    shift = 0
+    # Tags, lengths and small integers fit in one or two bytes, and values
+    # below 2^14 are never affected by the mask.
+    b = local_ord(buffer[pos])
+    if b < 0x80:
+      return (b, pos + 1)
+    b2 = local_ord(buffer[pos + 1])
+    if b2 < 0x80:
+      return ((b & 0x7f) | (b2 << 7), pos + 2)
+    result = (b & 0x7f) | ((b2 & 0x7f) << 7)
+    shift = 14
+    pos += 2
     while 1:
       b = local_ord(buffer[pos])
       result |= ((b & 0x7f) << shift)
@@ -130,8 +140,16 @@ def _SignedVarintDecoder(mask):
 
   local_ord = ord
   def DecodeVarint(buffer, pos):
-    result = 0
-    shift = 0
+    # Same fast path as _VarintDecoder(); values below 2^14 are positive.
+    b = local_ord(buffer[pos])
+    if b < 0x80:
+      return (b, pos + 1)
+    b2 = local_ord(buffer[pos + 1])
+    if b2 < 0x80:
+      return ((b & 0x7f) | (b2 << 7), pos + 2)
+    result = (b & 0x7f) | ((b2 & 0x7f) << 7)
+    shift = 14
+    pos += 2
     while 1:
       b = local_ord(buffer[pos])
       result |= ((b & 0x7f) << shift)
@@ -157,6 +175,44 @@ _DecodeVarint32 = _VarintDecoder((1 << 32) - 1)
 _DecodeSignedVarint32 = _SignedVarintDecoder((1 << 32) - 1)
 
 
+# Matches a byte with the continuation bit set, i.e. one that does not end a
+# varint.
+_CONTINUATION_BYTE = re.compile('[\x80-\xff]')
+
+
+def _VarintRunDecoder(decode_value):
+  """Return a decoder for a run of consecutive varints, such as the payload of
+  a packed field.
+
+  The returned decoder takes (buffer, pos, end) and returns a (values, new_pos)
+  pair.  Every stretch of one-byte varints is converted in bulk; only values
+  of two or more bytes go through decode_value, which must give one-byte values
+  unchanged (true of the plain and signed varint decoders, but not of ZigZag).
+  As with decode_value, new_pos > end means the last value was truncated.
+  """
+
+  local_search = _CONTINUATION_BYTE.search
+  def DecodeVarintRun(buffer, pos, end):
+    values = []
+    while pos < end:
+      match = local_search(buffer, pos, end)
+      stop = match.start() if match is not None else end
+      if stop > pos:
+        values.extend(bytearray(buffer[pos:stop]))
+        pos = stop
+      if pos < end:
+        (element, pos) = decode_value(buffer, pos)
+        values.append(element)
+    return (values, pos)
+  return DecodeVarintRun
+
+
+_DecodeVarintRun = _VarintRunDecoder(_DecodeVarint)
+_DecodeSignedVarintRun = _VarintRunDecoder(_DecodeSignedVarint)
+_DecodeVarint32Run = _VarintRunDecoder(_DecodeVarint32)
+_DecodeSignedVarint32Run = _VarintRunDecoder(_DecodeSignedVarint32)
+
+
 def ReadTag(buffer, pos):
   """Read a tag from the buffer, and return a (tag_bytes, new_pos) tuple.
 
@@ -178,13 +234,15 @@ def ReadTag(buffer, pos):
 # --------------------------------------------------------------------
 
 
-def _SimpleDecoder(wire_type, decode_value):
+def _SimpleDecoder(wire_type, decode_value, decode_run=None):
   """Return a constructor for a decoder for fields of a particular type.
 
   Args:
       wire_type:  The field's wire type.
       decode_value:  A function which decodes an individual value, e.g.
         _DecodeVarint()
+      decode_run:  Optionally, a function which decodes a whole packed run of
+        values at once, e.g. _DecodeVarintRun().
   """
 
   def SpecificDecoder(field_number, is_repeated, is_packed, key, new_default):
@@ -198,6 +256,9 @@ def _SimpleDecoder(wire_type, decode_value):
         endpoint += pos
         if endpoint > end:
           raise _DecodeError('Truncated message.')
+        if decode_run is not None:
+          (elements, pos) = decode_run(buffer, pos, endpoint)
+          value.extend(elements)
         while pos < endpoint:
           (element, pos) = decode_value(buffer, pos)
           value.append(element)
@@ -346,13 +407,16 @@ def _DoubleDecoder():
 
 
 Int32Decoder = EnumDecoder = _SimpleDecoder(
-    wire_format.WIRETYPE_VARINT, _DecodeSignedVarint32)
+    wire_format.WIRETYPE_VARINT, _DecodeSignedVarint32,
+    _DecodeSignedVarint32Run)
 
 Int64Decoder = _SimpleDecoder(
-    wire_format.WIRETYPE_VARINT, _DecodeSignedVarint)
+    wire_format.WIRETYPE_VARINT, _DecodeSignedVarint, _DecodeSignedVarintRun)
 
-UInt32Decoder = _SimpleDecoder(wire_format.WIRETYPE_VARINT, _DecodeVarint32)
-UInt64Decoder = _SimpleDecoder(wire_format.WIRETYPE_VARINT, _DecodeVarint)
+UInt32Decoder = _SimpleDecoder(
+    wire_format.WIRETYPE_VARINT, _DecodeVarint32, _DecodeVarint32Run)
+UInt64Decoder = _SimpleDecoder(
+    wire_format.WIRETYPE_VARINT, _DecodeVarint, _DecodeVarintRun)
 
 SInt32Decoder = _ModifiedDecoder(
     wire_format.WIRETYPE_VARINT, _DecodeVarint32, wire_format.ZigZagDecode)
@@ -519,11 +583,9 @@ def MessageDecoder(field_number, is_repeated, is_packed, key, new_default):
         new_pos = pos + size
         if new_pos > end:
           raise _DecodeError('Truncated message.')
-        # Read sub-message.
-        if value.add()._InternalParse(buffer, pos, new_pos) != new_pos:
-          # The only reason _InternalParse would return early is if it
-          # encountered an end-group tag.
-          raise _DecodeError('Unexpected end-group tag.')
+        # Only remember where the sub-message is; the container parses it
+        # the first time it is accessed.
+        value._AddLazy(buffer, pos, new_pos)
         # Predict that the next tag is another copy of the same repeated field.
         pos = new_pos + tag_len
         if buffer[new_pos:pos] != tag_bytes or new_pos == end:
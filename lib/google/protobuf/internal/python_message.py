@@ -56,6 +56,7 @@ except ImportError:
   from StringIO import StringIO
 import copy_reg
 import struct
+import threading
 import weakref
 
 # We use "as" to avoid name collisions with variables.
@@ -176,6 +177,7 @@ def _AddSlots(message_descriptor, dictionary):
                              '_is_present_in_parent',
                              '_listener',
                              '_listener_for_children',
+                             '_recycled',
                              '__weakref__']
 
 
@@ -268,12 +270,25 @@ def _DefaultValueConstructorForField(field):
       # been set.  (Depends on order in which we initialize the classes).
       message_type = field.message_type
       def MakeRepeatedMessageDefault(message):
-        return containers.RepeatedCompositeFieldContainer(
+        recycled = message._recycled
+        if recycled:
+          container = recycled.pop(field, None)
+          if container is not None:
+            return container
+        container = containers.RepeatedCompositeFieldContainer(
             message._listener_for_children, field.message_type)
+        if recycled is not None:
+          container._spare = []
+        return container
       return MakeRepeatedMessageDefault
     else:
       type_checker = type_checkers.GetTypeChecker(field.cpp_type, field.type)
       def MakeRepeatedScalarDefault(message):
+        recycled = message._recycled
+        if recycled:
+          container = recycled.pop(field, None)
+          if container is not None:
+            return container
         return containers.RepeatedScalarFieldContainer(
             message._listener_for_children, type_checker)
       return MakeRepeatedScalarDefault
@@ -282,7 +297,14 @@ def _DefaultValueConstructorForField(field):
     # _concrete_class may not yet be initialized.
     message_type = field.message_type
     def MakeSubMessageDefault(message):
+      recycled = message._recycled
+      if recycled:
+        result = recycled.pop(field, None)
+        if result is not None:
+          return result
       result = message_type._concrete_class()
+      if recycled is not None:
+        result._recycled = {}
       result._SetListener(message._listener_for_children)
       return result
     return MakeSubMessageDefault
@@ -307,6 +329,9 @@ def _AddInitMethod(message_descriptor, cls):
     self._is_present_in_parent = False
     self._listener = message_listener_mod.NullMessageListener()
     self._listener_for_children = _Listener(self)
+    # None, or in reuse mode (see _SetReuse()) the containers and
+    # sub-messages kept by Clear() for the field default constructors.
+    self._recycled = None
     for field_name, field_value in kwargs.iteritems():
       field = _GetFieldByName(message_descriptor, field_name)
       if field is None:
@@ -491,9 +516,9 @@ def _AddPropertiesForNonRepeatedCompositeField(field, cls):
   def getter(self):
     field_value = self._fields.get(field)
     if field_value is None:
-      # Construct a new object to represent this field.
-      field_value = message_type._concrete_class()  # use field.message_type?
-      field_value._SetListener(self._listener_for_children)
+      # Construct a new object to represent this field, or take back the one
+      # Clear() kept in reuse mode.
+      field_value = field._default_constructor(self)
 
       # Atomically check if another thread has preempted us and, if not, swap
       # in the new object we just created.  If someone has preempted us, we
@@ -643,11 +668,57 @@ def _AddClearMethod(message_descriptor, cls):
   """Helper for _AddMessageMethods()."""
   def Clear(self):
     # Clear fields.
+    if self._recycled is not None:
+      self._RecycleFields()
     self._fields = {}
     self._unknown_fields = ()
     self._Modified()
   cls.Clear = Clear
 
+  def RecycleFields(self):
+    """Empties the containers and sub-messages in self._fields and keeps
+    them in self._recycled, from where the field default constructors hand
+    them out again instead of allocating new ones.
+    """
+    recycled = self._recycled
+    for field, value in self._fields.iteritems():
+      if (field.label == _FieldDescriptor.LABEL_REPEATED or
+          field.cpp_type == _FieldDescriptor.CPPTYPE_MESSAGE):
+        value._Recycle()
+        recycled[field] = value
+  cls._RecycleFields = RecycleFields
+
+  def Recycle(self):
+    """Puts a sub-message kept by RecycleFields() back in the state of a
+    new one: no fields set and not present in its parent.
+    """
+    if self._recycled is None:
+      self._recycled = {}
+    self._RecycleFields()
+    self._fields = {}
+    self._unknown_fields = ()
+    self._cached_byte_size = 0
+    self._cached_byte_size_dirty = False
+    self._is_present_in_parent = False
+    self._listener_for_children.dirty = False
+  cls._Recycle = Recycle
+
+  def SetReuse(self, reuse):
+    """Turns reuse mode on or off.  In reuse mode Clear(), and so
+    ParseFromString(), keeps the repeated field containers and sub-messages
+    of this message, and the elements of the containers, and the next parse
+    fills them in again instead of allocating new ones.  Sub-messages are
+    put in reuse mode too.
+
+    References to fields of a message in reuse mode are only valid until the
+    message is next cleared.
+    """
+    if not reuse:
+      self._recycled = None
+    elif self._recycled is None:
+      self._recycled = {}
+  cls._SetReuse = SetReuse
+
 
 def _AddHasExtensionMethod(cls):
   """Helper for _AddMessageMethods()."""
@@ -766,16 +837,56 @@ def _AddSerializeToStringMethod(message_descriptor, cls):
           'Message %s is missing required fields: %s' % (
           self.DESCRIPTOR.full_name, ','.join(self.FindInitializationErrors())))
     return self.SerializePartialToString()
-  cls.SerializeToString = SerializeToString
+
+  # The encode plan checks required fields as it writes them, so the
+  # separate IsInitialized() pass is only needed with extensions.
+  extensions_by_number = cls._extensions_by_number
+  def SerializeToStringWithPlan(self):
+    if extensions_by_number:
+      return SerializeToString(self)
+    buffer = _TakeEncodeBuffer()
+    try:
+      self._InternalSerializeChecked(buffer.extend)
+      return str(buffer)
+    except _MissingRequiredField:
+      raise message_mod.EncodeError(
+          'Message %s is missing required fields: %s' % (
+          self.DESCRIPTOR.full_name, ','.join(self.FindInitializationErrors())))
+    finally:
+      _ReturnEncodeBuffer(buffer)
+  cls.SerializeToString = SerializeToStringWithPlan
+
+
+class _MissingRequiredField(Exception):
+  """Raised by an encode plan with checks when a required field is unset."""
+
+
+# A bytearray per thread to serialize into, reused from one call to the next.
+_encode_buffers = threading.local()
+
+
+def _TakeEncodeBuffer():
+  buffer = _encode_buffers.__dict__.pop('buffer', None)
+  if buffer is None:
+    return bytearray()
+  return buffer
+
+
+def _ReturnEncodeBuffer(buffer):
+  del buffer[:]
+  _encode_buffers.buffer = buffer
 
 
 def _AddSerializePartialToStringMethod(message_descriptor, cls):
   """Helper for _AddMessageMethods()."""
 
   def SerializePartialToString(self):
-    out = StringIO()
-    self._InternalSerialize(out.write)
-    return out.getvalue()
+    buffer = _TakeEncodeBuffer()
+    try:
+      self._InternalSerialize(buffer.extend)
+      return str(buffer)
+    finally:
+      _ReturnEncodeBuffer(buffer)
   cls.SerializePartialToString = SerializePartialToString
 
   def InternalSerialize(self, write_bytes):
@@ -784,7 +895,90 @@ def _AddSerializePartialToStringMethod(message_descriptor, cls):
     for tag_bytes, value_bytes in self._unknown_fields:
       write_bytes(tag_bytes)
       write_bytes(value_bytes)
-  cls._InternalSerialize = InternalSerialize
+  cls._InternalSerialize = _CompileEncodePlan(
+      message_descriptor, cls, InternalSerialize, False)
+  cls._InternalSerializeChecked = _CompileEncodePlan(
+      message_descriptor, cls, InternalSerialize, True)
+
+
+def _CompileEncodePlan(message_descriptor, cls, generic, checked):
+  """Returns an _InternalSerialize function specialized for
+  message_descriptor, the counterpart of _CompileDecodePlan().
+
+  The function writes the fields straight from _fields in field number order,
+  instead of asking ListFields() for them (which sorts them every time).
+  With checked, it also raises _MissingRequiredField for any required field
+  that is not set, in this message or a sub-message, so SerializeToString()
+  need not walk the message with IsInitialized() first.  Classes with
+  extensions registered use generic, which handles them.
+  """
+  namespace = {
+      'generic': generic,
+      'extensions_by_number': cls._extensions_by_number,
+      'EncodeVarint': encoder._EncodeVarint,
+      'MissingRequiredField': _MissingRequiredField,
+      }
+  lines = [
+      'def InternalSerialize(self, write_bytes):',
+      '  if extensions_by_number:',
+      ]
+  if checked:
+    lines.extend([
+        '    if not self.IsInitialized():',
+        '      raise MissingRequiredField()',
+        ])
+  lines.extend([
+      '    return generic(self, write_bytes)',
+      '  field_dict = self._fields',
+      ])
+  for field in sorted(message_descriptor.fields, key=lambda f: f.number):
+    name = '_%d' % field.number
+    namespace['key' + name] = field
+    namespace['encoder' + name] = field._encoder
+    is_repeated = field.label == _FieldDescriptor.LABEL_REPEATED
+    is_message = field.cpp_type == _FieldDescriptor.CPPTYPE_MESSAGE
+    lines.append('  value = field_dict.get(key%s)' % name)
+    if is_repeated:
+      lines.append('  if value:')
+    elif is_message:
+      lines.append('  if value is not None and value._is_present_in_parent:')
+    else:
+      lines.append('  if value is not None:')
+    if checked and is_message and field.type == _FieldDescriptor.TYPE_MESSAGE:
+      # Write the sub-messages here so they are checked as well.
+      namespace['tag' + name] = encoder.TagBytes(
+          field.number, wire_format.WIRETYPE_LENGTH_DELIMITED)
+      body = [
+          'write_bytes(tag%s)' % name,
+          'EncodeVarint(write_bytes, element.ByteSize())',
+          'element._InternalSerializeChecked(write_bytes)',
+          ]
+      if is_repeated:
+        lines.append('    for element in value:')
+        lines.extend('      ' + line for line in body)
+      else:
+        lines.append('    element = value')
+        lines.extend('    ' + line for line in body)
+    elif checked and is_message:
+      lines.append('    for element in %s:' % ('value' if is_repeated else '[value]'))
+      lines.append('      if not element.IsInitialized():')
+      lines.append('        raise MissingRequiredField()')
+      lines.append('    encoder%s(write_bytes, value)' % name)
+    else:
+      lines.append('    encoder%s(write_bytes, value)' % name)
+    if checked and field.label == _FieldDescriptor.LABEL_REQUIRED:
+      lines.append('  else:')
+      lines.append('    raise MissingRequiredField()')
+  lines.extend([
+      '  for tag_bytes, value_bytes in self._unknown_fields:',
+      '    write_bytes(tag_bytes)',
+      '    write_bytes(value_bytes)',
+      ])
+  source = '\n'.join(lines) + '\n'
+  exec compile(source, '<%s encode plan for %s>' % (
+      'checked' if checked else 'unchecked', message_descriptor.full_name),
+               'exec') in namespace
+  return namespace['InternalSerialize']
 
 
 def _AddMergeFromStringMethod(message_descriptor, cls):
@@ -803,30 +997,96 @@ def _AddMergeFromStringMethod(message_descriptor, cls):
     return length   # Return this for legacy reasons.
   cls.MergeFromString = MergeFromString
 
-  local_ReadTag = decoder.ReadTag
-  local_SkipField = decoder.SkipField
-  decoders_by_tag = cls._decoders_by_tag
+  cls._InternalParse = _CompileDecodePlan(message_descriptor, cls)
 
-  def InternalParse(self, buffer, pos, end):
-    self._Modified()
-    field_dict = self._fields
-    unknown_field_list = self._unknown_fields
-    while pos != end:
-      (tag_bytes, new_pos) = local_ReadTag(buffer, pos)
-      field_decoder = decoders_by_tag.get(tag_bytes)
-      if field_decoder is None:
-        value_start_pos = new_pos
-        new_pos = local_SkipField(buffer, new_pos, end, tag_bytes)
-        if new_pos == -1:
-          return pos
-        if not unknown_field_list:
-          unknown_field_list = self._unknown_fields = []
-        unknown_field_list.append((tag_bytes, buffer[value_start_pos:new_pos]))
-        pos = new_pos
-      else:
-        pos = field_decoder(buffer, new_pos, end, self, field_dict)
-    return pos
-  cls._InternalParse = InternalParse
+
+# Value decoders for the field types whose singular fields a decode plan
+# decodes inline rather than through the field's decoder.
+_INLINE_VALUE_DECODERS = {
+    _FieldDescriptor.TYPE_INT32: decoder._DecodeSignedVarint32,
+    _FieldDescriptor.TYPE_ENUM: decoder._DecodeSignedVarint32,
+    _FieldDescriptor.TYPE_INT64: decoder._DecodeSignedVarint,
+    _FieldDescriptor.TYPE_UINT32: decoder._DecodeVarint32,
+    _FieldDescriptor.TYPE_UINT64: decoder._DecodeVarint,
+    }
+
+
+def _CompileDecodePlan(message_descriptor, cls):
+  """Returns an _InternalParse function specialized for message_descriptor.
+
+  The function is generated once per class.  Every field with a one-byte tag
+  gets its own branch, compared against the first byte of the tag, so
+  it skips ReadTag() and the decoders_by_tag lookup.  Singular integer
+  fields are decoded inline.  Anything else (longer tags, extensions, unknown
+  fields) takes the generic path, so extensions registered later are still
+  decoded.
+  """
+  namespace = {
+      'ReadTag': decoder.ReadTag,
+      'SkipField': decoder.SkipField,
+      'decoders_by_tag': cls._decoders_by_tag,
+      'DecodeError': message_mod.DecodeError,
+      }
+  lines = [
+      'def InternalParse(self, buffer, pos, end):',
+      '  self._Modified()',
+      '  field_dict = self._fields',
+      '  unknown_field_list = self._unknown_fields',
+      '  while pos != end:',
+      '    tag_bytes = buffer[pos]',
+      ]
+  branch = 'if'
+  for field in sorted(message_descriptor.fields, key=lambda f: f.number):
+    wire_type = type_checkers.FIELD_TYPE_TO_WIRE_TYPE[field.type]
+    tag_bytes = encoder.TagBytes(field.number, wire_type)
+    if len(tag_bytes) != 1 or _IsMessageSetExtension(field):
+      continue
+    name = '_%d' % field.number
+    namespace['key' + name] = field
+    lines.append('    %s tag_bytes == %r:' % (branch, tag_bytes))
+    branch = 'elif'
+    value_decoder = _INLINE_VALUE_DECODERS.get(field.type)
+    if (value_decoder is not None and
+        field.label != _FieldDescriptor.LABEL_REPEATED):
+      namespace['decode_value' + name] = value_decoder
+      lines.extend([
+          '      (field_dict[key%s], pos) = decode_value%s(buffer, pos + 1)' % (
+              name, name),
+          '      if pos > end:',
+          '        del field_dict[key%s]  # Discard corrupt value.' % name,
+          '        raise DecodeError(\'Truncated message.\')',
+          ])
+    else:
+      namespace['decoder' + name] = cls._decoders_by_tag[tag_bytes]
+      lines.append(
+          '      pos = decoder%s(buffer, pos + 1, end, self, field_dict)' % name)
+  generic = [
+      '(tag_bytes, new_pos) = ReadTag(buffer, pos)',
+      'field_decoder = decoders_by_tag.get(tag_bytes)',
+      'if field_decoder is None:',
+      '  value_start_pos = new_pos',
+      '  new_pos = SkipField(buffer, new_pos, end, tag_bytes)',
+      '  if new_pos == -1:',
+      '    return pos',
+      '  if not unknown_field_list:',
+      '    unknown_field_list = self._unknown_fields = []',
+      '  unknown_field_list.append(',
+      '      (tag_bytes, buffer[value_start_pos:new_pos]))',
+      '  pos = new_pos',
+      'else:',
+      '  pos = field_decoder(buffer, new_pos, end, self, field_dict)',
+      ]
+  if branch == 'if':
+    lines.extend('    ' + line for line in generic)
+  else:
+    lines.append('    else:')
+    lines.extend('      ' + line for line in generic)
+  lines.append('  return pos')
+  source = '\n'.join(lines) + '\n'
+  exec compile(source, '<decode plan for %s>' % message_descriptor.full_name,
+               'exec') in namespace
+  cls._decode_plan_source = source
+  return namespace['InternalParse']
 
 
 def _AddIsInitializedMethod(message_descriptor, cls):
@@ -860,11 +1120,17 @@ def _AddIsInitializedMethod(message_descriptor, cls):
     for field, value in self._fields.iteritems():
       if field.cpp_type == _FieldDescriptor.CPPTYPE_MESSAGE:
         if field.label == _FieldDescriptor.LABEL_REPEATED:
-          for element in value:
-            if not element.IsInitialized():
-              if errors is not None:
-                errors.extend(self.FindInitializationErrors())
-              return False
+          try:
+            for element in value:
+              if not element.IsInitialized():
+                if errors is not None:
+                  errors.extend(self.FindInitializationErrors())
+                return False
+          except message_mod.DecodeError:
+            # An element parsed lazily (see containers) was malformed.
+            if errors is not None:
+              errors.extend(self.FindInitializationErrors())
+            return False
         elif value._is_present_in_parent and not value.IsInitialized():
           if errors is not None:
             errors.extend(self.FindInitializationErrors())
@@ -897,8 +1163,12 @@ def _AddIsInitializedMethod(message_descriptor, cls):
 
         if field.label == _FieldDescriptor.LABEL_REPEATED:
           for i in xrange(len(value)):
-            element = value[i]
             prefix = "%s[%d]." % (name, i)
+            try:
+              element = value[i]
+            except message_mod.DecodeError, e:
+              errors.append("%s[%d] (%s)" % (name, i, e))
+              continue
             sub_errors = element.FindInitializationErrors()
             errors += [ prefix + error for error in sub_errors ]
         else:
@@ -6,10 +6,11 @@ from bombmanplayer.PlayerAI import PlayerAI
 
 if __name__ == '__main__':
   
-  if len(sys.argv) != 4:
-    print "Usage: python runclient.py <host> <port> <playername>"
+  if len(sys.argv) not in (4, 5):
+    print "Usage: python runclient.py <host> <port> <playername> [turn deadline in milliseconds]"
   else:
     host = sys.argv[1]
     port = int(sys.argv[2])
     playername = sys.argv[3]
-    BombmanClient().runClient(PlayerAI(), host, port, playername)
\ No newline at end of file
+    deadline = int(sys.argv[4]) / 1000.0 if len(sys.argv) == 5 else None
+    BombmanClient(turn_deadline=deadline).runClient(PlayerAI(), host, port, playername)
\ No newline at end of file
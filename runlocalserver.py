@@ -0,0 +1,18 @@
+import sys, os
+sys.path.append(os.path.join(os.getcwd(), "lib"))
+sys.path.append(os.getcwd())
+
+from bombmansim.LocalServer import LocalServer
+
+if __name__ == '__main__':
+  
+  if len(sys.argv) not in (4, 5):
+    print "Usage: python runlocalserver.py <port> <number of clients> <number of games> [turn deadline in milliseconds]"
+    print "With one client, the second player is played by bombmanplayer.PlayerAI."
+  else:
+    port = int(sys.argv[1])
+    clients = int(sys.argv[2])
+    deadline = int(sys.argv[4]) / 1000.0 if len(sys.argv) == 5 else 1.0
+    server = LocalServer(port=port, clients=clients, opponent='bombmanplayer.PlayerAI:PlayerAI', deadline=deadline)
+    server.serve(int(sys.argv[3]))
+    print server.report()
@@ -0,0 +1,15 @@
+import sys, os
+sys.path.append(os.path.join(os.getcwd(), "lib"))
+sys.path.append(os.getcwd())
+
+from bombmansim.Tournament import run_tournament
+
+if __name__ == '__main__':
+  
+  if len(sys.argv) not in (4, 5):
+    print "Usage: python runtournament.py <ai module:class> <ai module:class> <number of games> [processes]"
+    print "e.g. python runtournament.py bombmanplayer.PlayerAI:PlayerAI bombmanplayer.PlayerAI:PlayerAI 1000"
+  else:
+    processes = int(sys.argv[4]) if len(sys.argv) == 5 else None
+    result = run_tournament(sys.argv[1], sys.argv[2], int(sys.argv[3]), processes)
+    print result.report()